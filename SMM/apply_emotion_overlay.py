@@ -2,9 +2,15 @@
 """Apply emotion-based color overlays to selected frames and optionally render full video."""
 
 import argparse
+import functools
+import heapq
 import json
 import math
+import os
+import queue
 import re
+import subprocess
+import threading
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Sequence
@@ -12,6 +18,11 @@ from typing import Dict, Iterable, List, Optional, Sequence
 import cv2
 import numpy as np
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; NumPy fallback below
+    njit = None
+
 
 @dataclass
 class ColorOverlayConfig:
@@ -28,7 +39,8 @@ EMOTION_MAP_RE = re.compile(r"emotion_map:\s*([^*]+)\*/")
 EMOTION_LINE_RE = re.compile(r"\|<-\s*([^:]+):")
 
 
-def hex_to_rgba(hex_color: str) -> np.ndarray:
+@functools.lru_cache(maxsize=256)
+def _hex_to_rgba_cached(hex_color: str) -> tuple:
     match = HEX_RE.search(hex_color)
     if not match:
         raise ValueError(f"Invalid hex color: {hex_color}")
@@ -37,7 +49,11 @@ def hex_to_rgba(hex_color: str) -> np.ndarray:
     g = int(value[2:4], 16)
     b = int(value[4:6], 16)
     a = int(value[6:8], 16)
-    return np.array([r, g, b, a], dtype=np.uint8)
+    return (r, g, b, a)
+
+
+def hex_to_rgba(hex_color: str) -> np.ndarray:
+    return np.array(_hex_to_rgba_cached(hex_color), dtype=np.uint8)
 
 
 def parse_m_string(path: Path) -> Dict[int, str]:
@@ -46,31 +62,33 @@ def parse_m_string(path: Path) -> Dict[int, str]:
 
     footer_match = EMOTION_MAP_RE.search(text)
     if footer_match:
-        entries = [segment.strip() for segment in footer_match.group(1).split(",") if segment.strip()]
-        for entry in entries:
-            if "=" not in entry:
+        for segment in footer_match.group(1).split(","):
+            entry = segment.strip()
+            if not entry or "=" not in entry:
+                continue
+            key, _, _ = entry.partition("=")
+            emotion_id, _, color = key.partition("@")
+            if not color:
                 continue
-            key, _ = entry.split("=", 1)
-            if "@" in key:
-                emotion_id, color = key.split("@", 1)
-                try:
-                    colors[int(emotion_id)] = f"#{color.strip()}" if not color.startswith("#") else color.strip()
-                except ValueError:
-                    continue
-
-    for match in EMOTION_LINE_RE.finditer(text):
-        token = match.group(1)
-        if "@" in token:
-            id_part, color_part = token.split("@", 1)
             try:
-                emo_id = int(id_part.strip())
+                colors[int(emotion_id)] = f"#{color.strip()}" if not color.startswith("#") else color.strip()
             except ValueError:
                 continue
-            if HEX_RE.match(color_part.strip()):
-                hex_color = color_part.strip()
-                if not hex_color.startswith("#"):
-                    hex_color = f"#{hex_color}"
-                colors.setdefault(emo_id, hex_color)
+
+    hex_match = HEX_RE.match
+    for match in EMOTION_LINE_RE.finditer(text):
+        id_part, _, color_part = match.group(1).partition("@")
+        if not color_part:
+            continue
+        try:
+            emo_id = int(id_part.strip())
+        except ValueError:
+            continue
+        hex_color = color_part.strip()
+        if hex_match(hex_color):
+            if not hex_color.startswith("#"):
+                hex_color = f"#{hex_color}"
+            colors.setdefault(emo_id, hex_color)
 
     return colors
 
@@ -107,37 +125,173 @@ def load_timeline(path: Optional[Path], default_colors: Sequence[str]) -> List[C
     return configs
 
 
+_SEGMENT_CACHE: Dict[int, tuple] = {}
+
+
+def _segment_index(configs: Sequence[ColorOverlayConfig]) -> tuple:
+    """Sorted (starts, ends, order, disjoint) for a timeline, cached per list."""
+    cached = _SEGMENT_CACHE.get(id(configs))
+    if cached is None or cached[0] is not configs:
+        starts = np.array([config.start_time for config in configs], dtype=np.float64)
+        order = np.argsort(starts, kind="stable")
+        starts = starts[order]
+        ends = starts + np.array([configs[i].duration for i in order], dtype=np.float64)
+        # Binary search is only exact when segments don't overlap
+        disjoint = len(starts) < 2 or bool(np.all(ends[:-1] <= starts[1:]))
+        if len(_SEGMENT_CACHE) >= 16:
+            _SEGMENT_CACHE.clear()
+        cached = (configs, starts, ends, order, disjoint)
+        _SEGMENT_CACHE[id(configs)] = cached
+    return cached
+
+
 def select_color(configs: Sequence[ColorOverlayConfig], timestamp: float) -> Optional[ColorOverlayConfig]:
-    for config in configs:
-        if config.start_time <= timestamp < config.start_time + config.duration:
-            return config
-    if configs:
-        return configs[-1]
-    return None
+    if not configs:
+        return None
+    _, starts, ends, order, disjoint = _segment_index(configs)
+    if disjoint:
+        i = int(np.searchsorted(starts, timestamp, side="right")) - 1
+        if 0 <= i < len(order) and timestamp < ends[i]:
+            return configs[order[i]]
+    else:
+        # Overlapping segments: first match in list order, same precedence
+        # as build_frame_config_table
+        for config in configs:
+            if config.start_time <= timestamp < config.start_time + config.duration:
+                return config
+    return configs[-1]
 
 
 def create_overlay(frame_shape, rgba: np.ndarray, overlay_type: str, intensity: float) -> np.ndarray:
     h, w = frame_shape[:2]
-    overlay = np.zeros((h, w, 3), dtype=np.float32)
     color = rgba[:3].astype(np.float32) / 255.0
 
     if overlay_type == "radial":
-        center = (w / 2.0, h / 2.0)
-        max_dist = math.hypot(center[0], center[1])
-        y_coords, x_coords = np.indices((h, w))
-        distances = np.sqrt((x_coords - center[0]) ** 2 + (y_coords - center[1]) ** 2)
-        mask = np.clip(1.0 - distances / max_dist, 0.0, 1.0) ** 1.5
-        for c in range(3):
-            overlay[:, :, c] = color[c] * mask
+        cx, cy = w / 2.0, h / 2.0
+        max_dist = math.hypot(cx, cy)
+        yy = np.arange(h, dtype=np.float32)[:, None] - cy
+        xx = np.arange(w, dtype=np.float32)[None, :] - cx
+        mask = np.clip(1.0 - np.sqrt(xx * xx + yy * yy) * (1.0 / max_dist), 0.0, 1.0)
+        np.power(mask, 1.5, out=mask)
+        overlay = mask[..., None] * color[None, None, :]
     else:
+        overlay = np.empty((h, w, 3), dtype=np.float32)
         overlay[:, :, :] = color
 
     alpha_scale = (rgba[3] / 255.0) * intensity
     return overlay, float(alpha_scale)
 
 
+_OVERLAY_CACHE: Dict[tuple, np.ndarray] = {}
+
+
+def get_overlay(frame_shape, rgba: np.ndarray, overlay_type: str, intensity: float):
+    """Cached create_overlay: the dense mask depends only on shape, type and color."""
+    key = (frame_shape[0], frame_shape[1], overlay_type, int(rgba[0]), int(rgba[1]), int(rgba[2]))
+    overlay = _OVERLAY_CACHE.get(key)
+    if overlay is None:
+        overlay, _ = create_overlay(frame_shape, rgba, overlay_type, intensity)
+        _OVERLAY_CACHE[key] = overlay
+    alpha_scale = (rgba[3] / 255.0) * intensity
+    return overlay, float(alpha_scale)
+
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def radial_blend(frame, r, g, b, alpha_scale, cx, cy, inv_max_dist):
+        h, w = frame.shape[:2]
+        out = np.empty_like(frame)
+        inv_alpha = 1.0 - alpha_scale
+        for y in prange(h):
+            dy = y - cy
+            for x in range(w):
+                dx = x - cx
+                m = 1.0 - math.sqrt(dx * dx + dy * dy) * inv_max_dist
+                if m < 0.0:
+                    m = 0.0
+                m = m * math.sqrt(m) * alpha_scale
+                out[y, x, 0] = np.uint8(frame[y, x, 0] * inv_alpha + r * m)
+                out[y, x, 1] = np.uint8(frame[y, x, 1] * inv_alpha + g * m)
+                out[y, x, 2] = np.uint8(frame[y, x, 2] * inv_alpha + b * m)
+        return out
+
+    # Warm up the JIT on a tiny frame so render_video pays compile cost up front.
+    radial_blend(np.zeros((2, 2, 3), dtype=np.uint8), 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0)
+
+
+_RADIAL_LUT_CACHE: Dict[tuple, tuple] = {}
+
+
+def _radial_lut(h: int, w: int) -> tuple:
+    """Per-shape integer distance field plus falloff LUT for the radial blend."""
+    cached = _RADIAL_LUT_CACHE.get((h, w))
+    if cached is None:
+        cx, cy = w / 2.0, h / 2.0
+        dy = np.arange(h, dtype=np.float32)[:, None] - cy
+        dx = np.arange(w, dtype=np.float32)[None, :] - cx
+        dist_int = np.sqrt(dy * dy + dx * dx).astype(np.int32)
+        max_dist = math.hypot(cx, cy)
+        lut = np.clip(1.0 - np.arange(int(max_dist) + 2) / max_dist, 0.0, 1.0) ** 1.5
+        cached = (dist_int, lut.astype(np.float32))
+        _RADIAL_LUT_CACHE[(h, w)] = cached
+    return cached
+
+
+def apply_radial_u8(frame: np.ndarray, rgba: np.ndarray, intensity: float) -> np.ndarray:
+    """Radial blend via distance LUT in uint16 fixed point — no per-pixel sqrt/pow."""
+    h, w = frame.shape[:2]
+    dist_int, lut = _radial_lut(h, w)
+    a_fixed = int(round(rgba[3] / 255.0 * intensity * 256.0))
+    m = (lut[dist_int] * a_fixed).astype(np.uint16)[..., None]
+    color = rgba[:3].astype(np.uint16)
+    return ((frame.astype(np.uint16) * (256 - a_fixed) + color * m) >> 8).astype(np.uint8)
+
+
+_COLOR_IMG_CACHE: Dict[tuple, np.ndarray] = {}
+
+
+def apply_tint_u8(frame: np.ndarray, rgba: np.ndarray, intensity: float) -> np.ndarray:
+    """Blend a constant tint with cv2.addWeighted — one fused SIMD kernel.
+
+    The constant-color plate is cached per (shape, color) so repeated frames
+    pay only the weighted add.
+    """
+    h, w = frame.shape[:2]
+    key = (h, w, int(rgba[0]), int(rgba[1]), int(rgba[2]))
+    color_img = _COLOR_IMG_CACHE.get(key)
+    if color_img is None:
+        color_img = np.empty((h, w, 3), dtype=np.uint8)
+        color_img[:] = rgba[:3]
+        _COLOR_IMG_CACHE[key] = color_img
+    alpha = rgba[3] / 255.0 * intensity
+    return cv2.addWeighted(frame, 1.0 - alpha, color_img, alpha, 0.0)
+
+
+def apply_tint_inplace(frame: np.ndarray, rgba: np.ndarray, intensity: float) -> None:
+    """Tint blend written back into the frame buffer; one int32 temp, no clip.
+
+    out = frame + ((color - frame) * a) >> 8 stays within [min(frame, color),
+    max(frame, color)], so no saturation pass is needed.
+    """
+    a = int(round(rgba[3] / 255.0 * intensity * 256.0))
+    mixed = frame.astype(np.int32)
+    mixed += ((rgba[:3].astype(np.int32) - mixed) * a) >> 8
+    frame[:] = mixed
+
+
 def apply_overlay(frame: np.ndarray, rgba: np.ndarray, overlay_type: str, intensity: float) -> np.ndarray:
-    overlay, alpha_scale = create_overlay(frame.shape, rgba, overlay_type, intensity)
+    if overlay_type == "tint":
+        return apply_tint_u8(frame, rgba, intensity)
+    if overlay_type == "radial":
+        if njit is not None:
+            h, w = frame.shape[:2]
+            cx, cy = w / 2.0, h / 2.0
+            alpha_scale = (rgba[3] / 255.0) * intensity
+            r, g, b = (float(v) for v in rgba[:3])
+            return radial_blend(frame, r, g, b, alpha_scale, cx, cy, 1.0 / math.hypot(cx, cy))
+        return apply_radial_u8(frame, rgba, intensity)
+    overlay, alpha_scale = get_overlay(frame.shape, rgba, overlay_type, intensity)
     frame_norm = frame.astype(np.float32) / 255.0
     blended = (1.0 - alpha_scale) * frame_norm + alpha_scale * overlay
     blended = np.clip(blended * 255.0, 0, 255).astype(np.uint8)
@@ -150,11 +304,37 @@ def extract_frames(video_path: Path, frame_indices: Sequence[int]) -> Dict[int,
         raise RuntimeError(f"Cannot open video: {video_path}")
 
     frames: Dict[int, np.ndarray] = {}
-    for idx in frame_indices:
-        capture.set(cv2.CAP_PROP_POS_FRAMES, idx)
-        success, frame = capture.read()
-        if success:
+    wanted = sorted(set(frame_indices))
+    if not wanted:
+        capture.release()
+        return frames
+
+    total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    if total_frames > 0 and len(wanted) < total_frames * 0.05:
+        # Very sparse selection: keyframe seeks cost less than grabbing everything.
+        for idx in wanted:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            success, frame = capture.read()
+            if success:
+                frames[idx] = frame
+        capture.release()
+        return frames
+
+    # Sequential pass: grab() skips decode on frames we don't need, so the
+    # decoder never rewinds to a keyframe the way per-frame seeks force it to.
+    wanted_iter = iter(wanted)
+    target = next(wanted_iter)
+    for idx in range(wanted[-1] + 1):
+        if idx == target:
+            success, frame = capture.read()
+            if not success:
+                break
             frames[idx] = frame
+            target = next(wanted_iter, None)
+            if target is None:
+                break
+        elif not capture.grab():
+            break
     capture.release()
     return frames
 
@@ -183,6 +363,22 @@ def create_sprite(frames: Sequence[np.ndarray], output_path: Path, cols: int = 5
     cv2.imwrite(str(output_path), sprite)
 
 
+def build_frame_config_table(
+    configs: Sequence[ColorOverlayConfig], fps: float, total_frames: int
+) -> np.ndarray:
+    """Map each frame index to its config index, mirroring select_color semantics."""
+    if not configs:
+        return np.full(total_frames, -1, dtype=np.int32)
+    table = np.full(total_frames, len(configs) - 1, dtype=np.int32)
+    for idx in range(len(configs) - 1, -1, -1):
+        config = configs[idx]
+        start = max(int(math.ceil(config.start_time * fps)), 0)
+        end = min(int(math.ceil((config.start_time + config.duration) * fps)), total_frames)
+        if start < end:
+            table[start:end] = idx
+    return table
+
+
 def render_video(
     video_path: Path,
     output_path: Path,
@@ -199,24 +395,98 @@ def render_video(
     height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
     total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    writer = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
-
-    for frame_idx in range(total_frames):
-        success, frame = capture.read()
-        if not success:
-            break
-        timestamp = frame_idx / fps
-        config = select_color(configs, timestamp)
-        if config:
-            rgba = hex_to_rgba(config.hex_color)
-            over_type = config.overlay_type or overlay_type
-            over_intensity = config.intensity if config.intensity is not None else intensity
-            frame = apply_overlay(frame, rgba, over_type, over_intensity)
-        writer.write(frame)
+    # ffmpeg/libx264 via a rawvideo pipe: modern encoder, far better
+    # compression than VideoWriter's mpeg4, and no extra copy per frame.
+    encoder = subprocess.Popen(
+        [
+            "ffmpeg",
+            "-y",
+            "-f", "rawvideo",
+            "-vcodec", "rawvideo",
+            "-s", f"{width}x{height}",
+            "-pix_fmt", "bgr24",
+            "-r", str(fps),
+            "-i", "-",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-pix_fmt", "yuv420p",
+            "-crf", "23",
+            str(output_path),
+        ],
+        stdin=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
 
+    configs = list(configs)
+    frame_to_cfg = build_frame_config_table(configs, fps, total_frames)
+    rgba_table = [hex_to_rgba(config.hex_color) for config in configs]
+    type_table = [config.overlay_type or overlay_type for config in configs]
+    intensity_table = [
+        config.intensity if config.intensity is not None else intensity for config in configs
+    ]
+
+    # Decode, blend and encode run as a 3-stage pipeline so disk/codec latency
+    # overlaps with the per-frame blend. Bounded queues cap frames in flight.
+    cv2.setNumThreads(1)
+    num_workers = max(1, (os.cpu_count() or 2) // 2)
+    decoded_q: "queue.Queue" = queue.Queue(maxsize=8)
+    blended_q: "queue.Queue" = queue.Queue(maxsize=8)
+
+    def read_frames() -> None:
+        for frame_idx in range(total_frames):
+            success, frame = capture.read()
+            if not success:
+                break
+            decoded_q.put((frame_idx, frame))
+        for _ in range(num_workers):
+            decoded_q.put(None)
+
+    def blend_frames() -> None:
+        while True:
+            item = decoded_q.get()
+            if item is None:
+                blended_q.put(None)
+                return
+            frame_idx, frame = item
+            cfg_idx = frame_to_cfg[frame_idx]
+            if cfg_idx >= 0:
+                # The decoded frame is write-owned here, so tint blends in place.
+                if type_table[cfg_idx] == "tint":
+                    apply_tint_inplace(frame, rgba_table[cfg_idx], intensity_table[cfg_idx])
+                else:
+                    frame = apply_overlay(
+                        frame, rgba_table[cfg_idx], type_table[cfg_idx], intensity_table[cfg_idx]
+                    )
+            blended_q.put((frame_idx, frame))
+
+    threads = [threading.Thread(target=read_frames, daemon=True)]
+    threads.extend(threading.Thread(target=blend_frames, daemon=True) for _ in range(num_workers))
+    for thread in threads:
+        thread.start()
+
+    # Workers may finish out of order; a heap reorders frames before encoding.
+    pending: List = []
+    next_idx = 0
+    finished_workers = 0
+    while finished_workers < num_workers:
+        item = blended_q.get()
+        if item is None:
+            finished_workers += 1
+            continue
+        heapq.heappush(pending, item)
+        while pending and pending[0][0] == next_idx:
+            _, frame = heapq.heappop(pending)
+            encoder.stdin.write(frame.tobytes())
+            next_idx += 1
+    while pending:
+        _, frame = heapq.heappop(pending)
+        encoder.stdin.write(frame.tobytes())
+
+    for thread in threads:
+        thread.join()
     capture.release()
-    writer.release()
+    encoder.stdin.close()
+    encoder.wait()
     print(f"Rendered video saved to {output_path}")
 
 
@@ -9,6 +9,7 @@ import sys
 import subprocess
 import tempfile
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 def check_dependencies():
@@ -35,23 +36,53 @@ def check_dependencies():
     
     return True, has_avifenc
 
+def probe_fps(video_path):
+    """Возвращает fps видео через ffprobe (None при ошибке)"""
+    result = subprocess.run(
+        [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=r_frame_rate',
+            '-of', 'csv=p=0',
+            video_path
+        ],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    try:
+        num, _, den = result.stdout.strip().partition('/')
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
 def extract_frames(video_path, output_dir, fps=24, quality=100):
     """Извлекает кадры из видео"""
     print(f"🎬 Извлечение кадров из {video_path}...")
-    
+
     # Создаем папку для кадров
     os.makedirs(output_dir, exist_ok=True)
-    
+
     # Извлекаем кадры через ffmpeg
     frame_pattern = os.path.join(output_dir, "frame_%05d.png")
-    
+
+    # При прореживании select+vfr дешевле, чем fps= (кадры отбрасываются
+    # по номеру, без ресемплинга таймстампов)
+    src_fps = probe_fps(video_path)
+    stride = max(1, int(round(src_fps / fps))) if src_fps else 1
+    if stride > 1:
+        vf = f"select=not(mod(n\\,{stride})),setpts=N/FRAME_RATE/TB"
+    else:
+        vf = f'fps={fps}'
+
     cmd = [
         'ffmpeg', '-i', video_path,
-        '-vf', f'fps={fps}',
+        '-vf', vf,
+        '-vsync', 'vfr',
         '-q:v', str(quality),  # Качество для PNG (2 = лучшее)
         '-y', frame_pattern
     ]
-    
+
     result = subprocess.run(cmd, capture_output=True, text=True)
     
     if result.returncode != 0:
@@ -106,20 +137,38 @@ def create_animated_webp(frames_dir, output_path, fps=24, quality=90, lossless=F
     
     return True
 
+def has_ffmpeg_encoder(name):
+    """Проверяет, собран ли ffmpeg с указанным кодировщиком"""
+    result = subprocess.run(
+        ['ffmpeg', '-hide_banner', '-encoders'],
+        capture_output=True, text=True
+    )
+    return result.returncode == 0 and name in result.stdout
+
 def create_animated_avif_ffmpeg(video_path, output_path, quality=50, lossless=False):
     """Создает анимированный AVIF через ffmpeg"""
     print(f"🎨 Создание анимированного AVIF: {output_path}")
-    
+
     cmd = ['ffmpeg', '-i', video_path]
-    
+
     if lossless:
-        # Без потерь через AV1
+        # Без потерь через AV1 (lossless у SVT-AV1 ограничен — оставляем libaom)
         cmd.extend([
             '-c:v', 'libaom-av1',
             '-crf', '0',
             '-b:v', '0',
             '-pix_fmt', 'yuv420p'
         ])
+    elif has_ffmpeg_encoder('libsvtav1'):
+        # SVT-AV1 на порядок быстрее референсного libaom при том же качестве;
+        # preset 8 — оптимум по скорости, для архива можно ниже
+        cmd.extend([
+            '-c:v', 'libsvtav1',
+            '-preset', '8',
+            '-crf', str(quality),  # 0-63, меньше = лучше качество
+            '-pix_fmt', 'yuv420p',
+            '-svtav1-params', 'tune=0'
+        ])
     else:
         # С потерями, но высокое качество
         cmd.extend([
@@ -128,7 +177,7 @@ def create_animated_avif_ffmpeg(video_path, output_path, quality=50, lossless=Fa
             '-b:v', '0',
             '-pix_fmt', 'yuv420p'
         ])
-    
+
     cmd.extend(['-y', output_path])
     
     result = subprocess.run(cmd, capture_output=True, text=True)
@@ -143,42 +192,52 @@ def create_animated_avif_ffmpeg(video_path, output_path, quality=50, lossless=Fa
     
     return True
 
+def _encode_avif_frame(cmd):
+    """Воркер пула: кодирует один AVIF кадр"""
+    subprocess.run(cmd, capture_output=True)
+
 def create_avif_sequence(frames_dir, output_dir, quality=50, lossless=False):
     """Создает последовательность AVIF кадров"""
     print(f"🎨 Создание последовательности AVIF кадров...")
-    
+
     frames = sorted(Path(frames_dir).glob("frame_*.png"))
     if not frames:
         print("❌ Кадры не найдены")
         return False
-    
+
     os.makedirs(output_dir, exist_ok=True)
-    
-    # Используем avifenc если доступен, иначе ffmpeg
+
+    # Собираем команды, кодируем параллельно — AV1 тяжёлый для CPU,
+    # но кадры независимы. avifenc получает -j 1, чтобы ядра
+    # не бронировались дважды (пул уже по ядру на файл)
+    cmds = []
     if shutil.which('avifenc'):
         for i, frame in enumerate(frames):
             output_frame = os.path.join(output_dir, f"frame_{i:05d}.avif")
-            cmd = ['avifenc']
-            
+            cmd = ['avifenc', '-j', '1']
+
             if lossless:
                 cmd.extend(['-l'])
             else:
                 cmd.extend(['-q', str(quality)])
-            
+
             cmd.extend([str(frame), output_frame])
-            subprocess.run(cmd, capture_output=True)
+            cmds.append(cmd)
     else:
         # Используем ffmpeg для каждого кадра
         for i, frame in enumerate(frames):
             output_frame = os.path.join(output_dir, f"frame_{i:05d}.avif")
-            cmd = [
+            cmds.append([
                 'ffmpeg', '-i', str(frame),
                 '-c:v', 'libaom-av1',
                 '-crf', '0' if lossless else str(quality),
+                '-threads', '1',
                 '-y', output_frame
-            ]
-            subprocess.run(cmd, capture_output=True)
-    
+            ])
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(_encode_avif_frame, cmds))
+
     print(f"✅ Создано {len(frames)} AVIF кадров")
     return True
 
@@ -6,126 +6,158 @@
 
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PIL import Image
+import cv2
+import numpy as np
 import math
 
-def extract_frames(video_path, output_dir, fps=1):
+def extract_frames(video_path, fps=1):
     """
-    Извлекает кадры из видео
+    Извлекает кадры из видео через ffmpeg с фильтром select
+    и rawvideo-пайпом (без промежуточных PNG на диске)
     fps - количество кадров в секунду для извлечения
     """
-    output_dir = Path(output_dir)
-    output_dir.mkdir(exist_ok=True)
-    
-    # Извлекаем кадры с заданной частотой
-    output_pattern = str(output_dir / "frame_%04d.png")
-    
     print(f"📹 Извлечение кадров из {video_path}...")
-    result = subprocess.run(
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        print(f"❌ Не удалось открыть видео: {video_path}")
+        return []
+
+    src_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    stride = max(1, int(round(src_fps / fps)))
+
+    # select пропускает ненужные кадры внутри libavfilter,
+    # сырые bgr24-пиксели читаем прямо из stdout
+    proc = subprocess.Popen(
         [
             'ffmpeg',
-            '-i', video_path,
-            '-vf', f'fps={fps}',
-            '-y',
-            output_pattern
+            '-i', str(video_path),
+            '-vf', f"select=not(mod(n\\,{stride}))",
+            '-vsync', 'vfr',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'bgr24',
+            '-'
         ],
-        capture_output=True,
-        check=True
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
     )
-    
-    # Находим все извлечённые кадры
-    frames = sorted(output_dir.glob("frame_*.png"))
+
+    frame_bytes = width * height * 3
+    frames = []
+    while True:
+        buf = proc.stdout.read(frame_bytes)
+        if len(buf) < frame_bytes:
+            break
+        frames.append(np.frombuffer(buf, dtype=np.uint8).reshape(height, width, 3))
+    proc.stdout.close()
+    proc.wait()
+
     print(f"✅ Извлечено {len(frames)} кадров")
     return frames
 
-def create_storyboard_atlas(frames, output_path, cols=None, thumb_size=None):
+def save_atlas(atlas, output_path):
+    """Сохраняет атлас в PNG (уровень 9 очень медленный, 3 — оптимум)"""
+    cv2.imwrite(str(output_path), atlas, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+    file_size = os.path.getsize(output_path) / (1024 * 1024)
+    print(f"✅ Атлас сохранён: {output_path} ({file_size:.2f}MB)")
+
+def create_storyboard_atlas(frames, output_path=None, cols=None, thumb_size=None):
     """
     Создаёт атлас из кадров
-    frames - список путей к кадрам
-    output_path - путь для сохранения атласа
+    frames - список кадров (numpy-массивы BGR)
+    output_path - путь для сохранения атласа (None — не сохранять, только вернуть)
     cols - количество колонок (автоматически если None)
     thumb_size - размер миниатюры (ширина, высота) или None для оригинального размера
     """
     if not frames:
         print("❌ Нет кадров для создания атласа")
         return
-    
+
     print(f"🎨 Создание атласа из {len(frames)} кадров...")
-    
-    # Загружаем первый кадр для определения размера
-    first_img = Image.open(frames[0])
-    img_width, img_height = first_img.size
-    
+
+    # Размер кадра берём из первого
+    img_height, img_width = frames[0].shape[:2]
+
     # Если указан размер миниатюры, используем его
     if thumb_size:
         thumb_width, thumb_height = thumb_size
     else:
         thumb_width, thumb_height = img_width, img_height
-    
+
     # Определяем количество колонок
     if cols is None:
         # Автоматически: квадратная сетка или немного шире
         cols = math.ceil(math.sqrt(len(frames)))
-    
+
     rows = math.ceil(len(frames) / cols)
-    
-    # Создаём большой canvas
+
+    # Создаём большой canvas (numpy, BGR — как отдают кадры cv2)
     atlas_width = cols * thumb_width
     atlas_height = rows * thumb_height
-    atlas = Image.new('RGB', (atlas_width, atlas_height), color=(0, 0, 0))
-    
+    atlas = np.zeros((atlas_height, atlas_width, 3), dtype=np.uint8)
+
     print(f"📐 Атлас: {atlas_width}x{atlas_height}px, сетка: {cols}x{rows}")
-    
-    # Размещаем кадры
-    for idx, frame_path in enumerate(frames):
+
+    # Каждая плитка независима, а cv2.resize отпускает GIL —
+    # раскладываем кадры в пуле потоков, по потоку на ядро
+    cv2.setNumThreads(1)
+
+    def place_tile(idx):
+        frame = frames[idx]
         row = idx // cols
         col = idx % cols
-        
+
         try:
-            img = Image.open(frame_path)
-            
-            # Ресайзим если нужно
+            # Ресайзим если нужно (cv2.resize векторизован через SIMD)
             if thumb_size:
-                img = img.resize((thumb_width, thumb_height), Image.Resampling.LANCZOS)
-            
+                frame = cv2.resize(frame, (thumb_width, thumb_height), interpolation=cv2.INTER_AREA)
+
             # Вычисляем позицию
             x = col * thumb_width
             y = row * thumb_height
-            
-            # Вставляем кадр
-            atlas.paste(img, (x, y))
-            
+
+            # Вставляем кадр: обычный срез — один memcpy
+            atlas[y:y + thumb_height, x:x + thumb_width] = frame
+
         except Exception as e:
-            print(f"⚠️ Ошибка при обработке {frame_path}: {e}")
-    
-    # Сохраняем атлас
-    atlas.save(output_path, 'PNG', optimize=True, compress_level=9)
-    file_size = os.path.getsize(output_path) / (1024 * 1024)
-    print(f"✅ Атлас сохранён: {output_path} ({file_size:.2f}MB)")
-    
+            print(f"⚠️ Ошибка при обработке кадра {idx}: {e}")
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(place_tile, range(len(frames))))
+
+    # Сохраняем только если не будет этапа подписей — иначе один save в конце
+    if output_path is not None:
+        save_atlas(atlas, output_path)
+
     return atlas
 
-def add_labels_to_atlas(atlas_path, frames, cols, thumb_width, thumb_height):
+def add_labels_to_atlas(atlas, num_frames, cols, thumb_width, thumb_height):
     """
     Добавляет подписи с временными метками к кадрам
+    (атлас остаётся в памяти — никакого PNG decode/encode ради текста)
     """
     from PIL import ImageDraw, ImageFont
-    
+
     try:
-        atlas = Image.open(atlas_path)
-        draw = ImageDraw.Draw(atlas)
-        
+        atlas_img = Image.fromarray(cv2.cvtColor(atlas, cv2.COLOR_BGR2RGB))
+        draw = ImageDraw.Draw(atlas_img)
+
         # Пробуем загрузить шрифт
         try:
             font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 20)
         except:
             font = ImageFont.load_default()
-        
-        rows = math.ceil(len(frames) / cols)
-        
+
+        rows = math.ceil(num_frames / cols)
+
         # Добавляем временные метки
-        for idx, frame_path in enumerate(frames):
+        for idx in range(num_frames):
             row = idx // cols
             col = idx % cols
             
@@ -142,12 +174,13 @@ def add_labels_to_atlas(atlas_path, frames, cols, thumb_width, thumb_height):
             
             # Рисуем текст
             draw.text((x, y), time_str, fill=(255, 255, 255), font=font)
-        
-        atlas.save(atlas_path, 'PNG', optimize=True)
+
         print(f"✅ Добавлены временные метки")
-        
+        return cv2.cvtColor(np.asarray(atlas_img), cv2.COLOR_RGB2BGR)
+
     except Exception as e:
         print(f"⚠️ Не удалось добавить метки: {e}")
+        return atlas
 
 def main():
     """Основная функция"""
@@ -158,8 +191,6 @@ def main():
                        help="Входное видео")
     parser.add_argument("-o", "--output", default="storyboard/storyboard_atlas.png",
                        help="Выходной PNG-атлас")
-    parser.add_argument("-d", "--dir", default="storyboard",
-                       help="Папка для временных кадров")
     parser.add_argument("-fps", type=float, default=1.0,
                        help="Частота извлечения кадров (кадров в секунду)")
     parser.add_argument("-c", "--cols", type=int, default=None,
@@ -177,8 +208,8 @@ def main():
         return
     
     # Извлекаем кадры
-    frames = extract_frames(str(video_path), args.dir, fps=args.fps)
-    
+    frames = extract_frames(str(video_path), fps=args.fps)
+
     if not frames:
         print("❌ Не удалось извлечь кадры")
         return
@@ -191,30 +222,29 @@ def main():
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
     atlas = create_storyboard_atlas(
-        frames, 
-        str(output_path),
+        frames,
+        output_path=None if args.labels else str(output_path),
         cols=args.cols,
         thumb_size=thumb_size
     )
-    
-    # Добавляем метки если нужно
-    if args.labels and atlas:
-        first_img = Image.open(frames[0])
-        img_width, img_height = first_img.size
+
+    # Добавляем метки если нужно, сохраняем ровно один раз
+    if args.labels and atlas is not None:
+        img_height, img_width = frames[0].shape[:2]
         thumb_width = thumb_size[0] if thumb_size else img_width
         thumb_height = thumb_size[1] if thumb_size else img_height
         cols = args.cols or math.ceil(math.sqrt(len(frames)))
-        
-        add_labels_to_atlas(
-            str(output_path),
-            frames,
+
+        atlas = add_labels_to_atlas(
+            atlas,
+            len(frames),
             cols,
             thumb_width,
             thumb_height
         )
-    
+        save_atlas(atlas, output_path)
+
     print(f"\n✅ Раскадровка готова: {output_path}")
-    print(f"📁 Кадры сохранены в: {args.dir}/")
 
 if __name__ == "__main__":
     main()
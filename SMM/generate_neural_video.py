@@ -64,49 +64,94 @@ def create_threejs_script(output_path="neuro_generated.mp4", duration=10):
         const numNodes = 500;
         const radius = 15;
         
-        // Генерация узлов в форме цветка/спирали
+        // Генерация узлов в форме цветка/спирали.
+        // Один InstancedMesh вместо 500 отдельных Mesh: 1 draw call,
+        // позиции и цвета узлов живут в общих GPU-буферах
+        const nodeMesh = new THREE.InstancedMesh(
+            new THREE.SphereGeometry(0.15, 8, 8),
+            new THREE.MeshBasicMaterial(),
+            numNodes
+        );
+        const dummy = new THREE.Object3D();
         for (let i = 0; i < numNodes; i++) {
             const angle = (i / numNodes) * Math.PI * 4;
             const spiralRadius = (i / numNodes) * 8;
             const height = Math.sin(angle * 2) * 3;
-            
+
             const x = Math.cos(angle) * spiralRadius;
             const y = height;
             const z = Math.sin(angle) * spiralRadius;
-            
-            // Создание узла
-            const geometry = new THREE.SphereGeometry(0.15, 8, 8);
-            const material = new THREE.MeshBasicMaterial({ 
-                color: colors.purple,
-                emissive: colors.purple,
-                emissiveIntensity: 0.8
-            });
-            const node = new THREE.Mesh(geometry, material);
-            node.position.set(x, y, z);
-            scene.add(node);
-            nodes.push({ mesh: node, basePos: { x, y, z }, color: colors.purple });
+
+            dummy.position.set(x, y, z);
+            dummy.updateMatrix();
+            nodeMesh.setMatrixAt(i, dummy.matrix);
+            nodeMesh.setColorAt(i, colors.purple);
+            nodes.push({ basePos: { x, y, z }, position: new THREE.Vector3(x, y, z) });
         }
+        scene.add(nodeMesh);
         
-        // Создание связей между узлами
+        // Создание связей между узлами.
+        // Spatial hash: узлы раскладываются по 3D-ячейкам размера порога,
+        // кандидаты берутся только из 27 соседних ячеек — O(N·k) вместо O(N²)
+        const connectDist = 2.5;
+        const grid = new Map();
+        const cellKey = (x, y, z) =>
+            ((x / connectDist) | 0) + ',' + ((y / connectDist) | 0) + ',' + ((z / connectDist) | 0);
+        nodes.forEach((node, i) => {
+            const key = cellKey(node.basePos.x, node.basePos.y, node.basePos.z);
+            if (!grid.has(key)) grid.set(key, []);
+            grid.get(key).push(i);
+        });
+
         for (let i = 0; i < nodes.length; i++) {
-            for (let j = i + 1; j < nodes.length; j++) {
-                const dist = nodes[i].mesh.position.distanceTo(nodes[j].mesh.position);
-                if (dist < 2.5) {
-                    const geometry = new THREE.BufferGeometry().setFromPoints([
-                        nodes[i].mesh.position,
-                        nodes[j].mesh.position
-                    ]);
-                    const material = new THREE.LineBasicMaterial({ 
-                        color: colors.blue,
-                        opacity: 0.3,
-                        transparent: true
-                    });
-                    const line = new THREE.Line(geometry, material);
-                    scene.add(line);
-                    connections.push(line);
+            const p = nodes[i].position;
+            const cx = (p.x / connectDist) | 0;
+            const cy = (p.y / connectDist) | 0;
+            const cz = (p.z / connectDist) | 0;
+            for (let dx = -1; dx <= 1; dx++)
+            for (let dy = -1; dy <= 1; dy++)
+            for (let dz = -1; dz <= 1; dz++) {
+                const bucket = grid.get((cx + dx) + ',' + (cy + dy) + ',' + (cz + dz));
+                if (!bucket) continue;
+                for (const j of bucket) {
+                    if (j <= i) continue;
+                    const dist = p.distanceTo(nodes[j].position);
+                    if (dist < connectDist) {
+                        connections.push(i, j);
+                    }
                 }
             }
         }
+
+        // Все связи — один LineSegments с общим динамическим буфером
+        // позиций: одна загрузка в GPU на кадр вместо объекта на связь
+        const numConnections = connections.length / 2;
+        const linePositions = new Float32Array(numConnections * 6);
+        const lineGeometry = new THREE.BufferGeometry();
+        lineGeometry.setAttribute('position',
+            new THREE.BufferAttribute(linePositions, 3).setUsage(THREE.DynamicDrawUsage));
+        const lineMaterial = new THREE.LineBasicMaterial({
+            color: colors.blue,
+            opacity: 0.3,
+            transparent: true
+        });
+        scene.add(new THREE.LineSegments(lineGeometry, lineMaterial));
+
+        function updateLinePositions() {
+            for (let c = 0; c < numConnections; c++) {
+                const a = nodes[connections[c * 2]].position;
+                const b = nodes[connections[c * 2 + 1]].position;
+                const o = c * 6;
+                linePositions[o] = a.x;
+                linePositions[o + 1] = a.y;
+                linePositions[o + 2] = a.z;
+                linePositions[o + 3] = b.x;
+                linePositions[o + 4] = b.y;
+                linePositions[o + 5] = b.z;
+            }
+            lineGeometry.attributes.position.needsUpdate = true;
+        }
+        updateLinePositions();
         
         // Камера - медленное вращение
         camera.position.set(0, 5, 25);
@@ -114,44 +159,43 @@ def create_threejs_script(output_path="neuro_generated.mp4", duration=10):
         
         // Анимация
         let time = 0;
-        const clock = new THREE.Clock();
-        
-        function animate() {
-            time += 0.016; // ~60fps
-            
+
+        function renderFrame(t) {
+            time = t;
+
             // Дыхание - расширение и сжатие
             const breath = 1 + Math.sin(time * 0.5) * 0.2;
             
-            // Обновление узлов
+            // Обновление узлов: пишем матрицы и цвета в общие instanced-буферы
             nodes.forEach((node, i) => {
                 const angle = (i / numNodes) * Math.PI * 4 + time * 0.1;
                 const spiralRadius = (i / numNodes) * 8 * breath;
                 const height = Math.sin(angle * 2) * 3;
-                
+
                 const x = Math.cos(angle) * spiralRadius;
                 const y = height;
                 const z = Math.sin(angle) * spiralRadius;
-                
-                node.mesh.position.set(x, y, z);
-                
+
+                node.position.set(x, y, z);
+                dummy.position.set(x, y, z);
+                dummy.updateMatrix();
+                nodeMesh.setMatrixAt(i, dummy.matrix);
+
                 // Мерцание цветов
                 const colorPhase = (i / numNodes + time * 0.3) % 1;
                 if (colorPhase < 0.33) {
-                    node.mesh.material.color = colors.purple;
-                    node.mesh.material.emissive = colors.purple;
+                    nodeMesh.setColorAt(i, colors.purple);
                 } else if (colorPhase < 0.66) {
-                    node.mesh.material.color = colors.blue;
-                    node.mesh.material.emissive = colors.blue;
+                    nodeMesh.setColorAt(i, colors.blue);
                 } else {
-                    node.mesh.material.color = colors.turquoise;
-                    node.mesh.material.emissive = colors.turquoise;
+                    nodeMesh.setColorAt(i, colors.turquoise);
                 }
             });
+            nodeMesh.instanceMatrix.needsUpdate = true;
+            nodeMesh.instanceColor.needsUpdate = true;
             
-            // Обновление связей
-            connections.forEach(conn => {
-                conn.geometry.setFromPoints([conn.geometry.attributes.position.array]);
-            });
+            // Обновление связей: переписываем общий буфер позиций
+            updateLinePositions();
             
             // Вращение камеры
             const angle = time * 0.1;
@@ -160,10 +204,22 @@ def create_threejs_script(output_path="neuro_generated.mp4", duration=10):
             camera.lookAt(0, 0, 0);
             
             renderer.render(scene, camera);
+        }
+
+        // Хук для offline-захвата: Puppeteer двигает время фиксированным
+        // шагом через window.setTime(t) — кадры детерминированы, без
+        // дрейфа requestAnimationFrame
+        window.setTime = renderFrame;
+
+        function animate() {
+            renderFrame(time + 0.016); // ~60fps
             requestAnimationFrame(animate);
         }
-        
-        animate();
+
+        // В режиме захвата временем управляет Puppeteer
+        if (!location.search.includes('capture')) {
+            animate();
+        }
     </script>
 </body>
 </html>'''
@@ -173,32 +229,87 @@ def create_threejs_script(output_path="neuro_generated.mp4", duration=10):
     print(f"✅ HTML-файл создан: {output_file}")
     return output_file
 
-def generate_video_with_ffmpeg():
-    """Альтернативный метод: использование ffmpeg для создания видео из кадров"""
-    print("📹 Для генерации видео через Three.js потребуется:")
-    print("   1. Установить Puppeteer: npm install puppeteer")
-    print("   2. Запустить headless Chrome для рендеринга кадров")
-    print("   3. Использовать ffmpeg для сборки видео из кадров")
-    print("\n💡 Рекомендация: Используйте промт из VEO_PROMPT.md с генеративными сервисами")
+CAPTURE_JS = '''const puppeteer = require('puppeteer');
+
+const htmlPath = process.argv[2];
+const frames = parseInt(process.argv[3], 10);
+const fps = parseInt(process.argv[4], 10);
+
+(async () => {
+    const browser = await puppeteer.launch({
+        headless: 'new',
+        args: ['--no-sandbox', '--hide-scrollbars', '--force-device-scale-factor=1']
+    });
+    const page = await browser.newPage();
+    await page.setViewport({ width: 1920, height: 1080 });
+    await page.goto('file://' + htmlPath + '?capture=1');
+    await page.waitForFunction('typeof window.setTime === "function"');
+
+    for (let i = 0; i < frames; i++) {
+        await page.evaluate(t => window.setTime(t), i / fps);
+        const buf = await page.screenshot({ type: 'png' });
+        process.stdout.write(buf);
+    }
+
+    await browser.close();
+})();
+'''
+
+def has_nvenc():
+    """Проверяет наличие GPU-энкодера h264_nvenc в ffmpeg"""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                capture_output=True, text=True, timeout=10)
+        return 'h264_nvenc' in result.stdout
+    except (subprocess.SubprocessError, FileNotFoundError):
+        return False
+
+def generate_video_with_ffmpeg(html_file, output_path="neuro_generated.mp4", duration=10, fps=60):
+    """Оффлайн-захват: Puppeteer рендерит кадры с фиксированным шагом времени
+    через window.setTime(t), PNG-поток уходит в ffmpeg (NVENC, если доступен)"""
+    capture_js = Path("capture.js")
+    capture_js.write_text(CAPTURE_JS, encoding='utf-8')
+
+    frames = duration * fps
+    if has_nvenc():
+        codec = ['-c:v', 'h264_nvenc', '-preset', 'p4', '-cq', '23']
+    else:
+        codec = ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23']
+
+    node_cmd = ['node', str(capture_js), str(Path(html_file).absolute()),
+                str(frames), str(fps)]
+    ffmpeg_cmd = ['ffmpeg', '-y', '-f', 'image2pipe', '-framerate', str(fps),
+                  '-i', '-', *codec, '-pix_fmt', 'yuv420p', output_path]
+
+    print(f"🎥 Захват {frames} кадров ({fps} fps) через Puppeteer...")
+    node_proc = subprocess.Popen(node_cmd, stdout=subprocess.PIPE)
+    ffmpeg_proc = subprocess.Popen(ffmpeg_cmd, stdin=node_proc.stdout)
+    node_proc.stdout.close()
+    ffmpeg_proc.wait()
+    node_proc.wait()
+
+    if node_proc.returncode == 0 and ffmpeg_proc.returncode == 0:
+        print(f"✅ Видео готово: {output_path}")
+        return True
+
+    print("⚠️  Захват не удался. Проверьте: npm install puppeteer")
+    print("💡 Альтернатива: промт из VEO_PROMPT.md с генеративными сервисами")
     print("   (Veo, Runway, Pika Labs) для более качественного результата.")
+    return False
 
 def main():
     """Основная функция"""
     print("🎬 Генератор видео нейронной сети\n")
     
-    if not check_dependencies():
-        generate_video_with_ffmpeg()
-        return
-    
     # Создаём HTML-файл для визуализации
     html_file = create_threejs_script()
-    
     print(f"\n📄 HTML-файл готов: {html_file}")
-    print("💡 Откройте его в браузере для предварительного просмотра")
-    print("📝 Для записи видео используйте:")
-    print("   - OBS Studio (экранная запись)")
-    print("   - Puppeteer + ffmpeg (автоматизация)")
-    print("   - Или промт из VEO_PROMPT.md с генеративными сервисами")
+
+    if not check_dependencies():
+        print("💡 Откройте HTML в браузере для предварительного просмотра")
+        return
+
+    generate_video_with_ffmpeg(html_file)
 
 if __name__ == "__main__":
     main()
@@ -5,17 +5,100 @@
 """
 
 import os
+import shutil
 import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from PIL import Image
 import sys
 
+def _png_idat_ratio(path):
+    """Отношение сжатых IDAT-байт к сырому размеру пикселей.
+
+    Читаются только заголовки чанков (без декодирования картинки);
+    низкое значение означает, что deflate уже близок к своему полу."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(8) != b'\x89PNG\r\n\x1a\n':
+                return None
+            width = height = None
+            bpp = 4
+            idat_bytes = 0
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                length = int.from_bytes(header[:4], 'big')
+                ctype = header[4:8]
+                if ctype == b'IHDR':
+                    ihdr = f.read(length)
+                    width = int.from_bytes(ihdr[0:4], 'big')
+                    height = int.from_bytes(ihdr[4:8], 'big')
+                    bit_depth, color_type = ihdr[8], ihdr[9]
+                    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(color_type, 4)
+                    bpp = max(1, channels * bit_depth // 8)
+                    f.seek(4, 1)  # CRC
+                    continue
+                if ctype == b'IDAT':
+                    idat_bytes += length
+                elif ctype == b'IEND':
+                    break
+                f.seek(length + 4, 1)
+            if not width or not height:
+                return None
+            return idat_bytes / (width * height * bpp)
+    except OSError:
+        return None
+
 def optimize_png(input_path, output_path=None):
     """Оптимизация PNG с сохранением качества"""
     input_str = str(input_path)
     if output_path is None:
         output_path = input_str
-    
+
+    # pngquant (квантование палитры) + oxipng (нормальный перебор deflate)
+    # жмут в разы лучше, чем Pillow optimize=True
+    if shutil.which('pngquant'):
+        tmp_path = input_str + '.quant.png'
+        try:
+            result = subprocess.run(
+                ['pngquant', '--skip-if-larger', '--speed', '1',
+                 '--quality=70-95', '--force', '--output', tmp_path, input_str],
+                capture_output=True
+            )
+            if result.returncode == 0 and os.path.exists(tmp_path):
+                if shutil.which('oxipng'):
+                    subprocess.run(
+                        ['oxipng', '-o', 'max', '--strip', 'safe', tmp_path],
+                        capture_output=True
+                    )
+                orig_size = os.path.getsize(input_str)
+                new_size = os.path.getsize(tmp_path)
+                saved = orig_size - new_size
+                if saved > 0:
+                    print(f"  ✅ PNG (pngquant): {saved/1024:.1f}KB сохранено ({orig_size/1024:.1f}KB → {new_size/1024:.1f}KB)")
+                    os.replace(tmp_path, output_path)
+                    return True
+                os.remove(tmp_path)
+                return False
+            if result.returncode in (98, 99):
+                # 98 — результат больше оригинала, 99 — качество недостижимо;
+                # Pillow тут тем более не поможет
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            # Падаем на Pillow-путь ниже
+
+    # Уже плотно сжатый PNG (например, после TinyPNG) перекодировать
+    # бессмысленно: decode+encode стоит сотни миллисекунд на мегабайтных
+    # файлах, а выигрыш — ноль байт
+    ratio = _png_idat_ratio(input_str)
+    if ratio is not None and ratio < 0.35:
+        return False
+
     try:
         img = Image.open(input_str)
         # Конвертируем в RGB если нужно
@@ -91,31 +174,127 @@ def optimize_gif(input_path, output_path=None):
     
     return False
 
-def optimize_mp4(input_path, output_path=None):
+def convert_gif(input_path, mode='webp'):
+    """Конвертация GIF в анимированный WebP или MP4
+
+    GIF — неэффективный контейнер (LZW, палитра на кадр); межкадровое
+    предсказание WebP/H.264 жмёт анимации в 5-20 раз. Конвертированный
+    файл остаётся рядом с GIF и только если он меньше.
+    """
+    input_str = str(input_path)
+    orig_size = os.path.getsize(input_str)
+
+    if mode == 'mp4':
+        output_path = input_str[:-4] + '.mp4'
+        cmd = [
+            'ffmpeg', '-i', input_str,
+            '-c:v', 'libx264', '-crf', '23',
+            '-pix_fmt', 'yuv420p',
+            '-vf', 'scale=trunc(iw/2)*2:trunc(ih/2)*2',
+            '-movflags', '+faststart',
+            '-y', output_path
+        ]
+    else:
+        output_path = input_str[:-4] + '.webp'
+        cmd = [
+            'ffmpeg', '-i', input_str,
+            '-c:v', 'libwebp_anim',
+            '-lossless', '0', '-q:v', '75', '-loop', '0',
+            '-y', output_path
+        ]
+
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+    except Exception as e:
+        print(f"  ❌ Ошибка конвертации GIF: {e}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return False
+
+    new_size = os.path.getsize(output_path)
+    saved = orig_size - new_size
+    if saved > 0:
+        print(f"  ✅ GIF → {mode.upper()}: {saved/1024/1024:.2f}MB сохранено ({orig_size/1024/1024:.2f}MB → {new_size/1024/1024:.2f}MB)")
+        return True
+    os.remove(output_path)
+    return False
+
+_NVENC_AVAILABLE = None
+
+def _has_nvenc():
+    """Проверяет наличие h264_nvenc в сборке ffmpeg (кэшируется)"""
+    global _NVENC_AVAILABLE
+    if _NVENC_AVAILABLE is None:
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-encoders'],
+                capture_output=True, text=True
+            )
+            _NVENC_AVAILABLE = result.returncode == 0 and 'h264_nvenc' in result.stdout
+        except FileNotFoundError:
+            _NVENC_AVAILABLE = False
+    return _NVENC_AVAILABLE
+
+def _probe_duration(path):
+    """Длительность клипа в секундах через ffprobe (None, если не удалось)"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+             '-of', 'default=noprint_wrappers=1:nokey=1', str(path)],
+            capture_output=True, text=True
+        )
+        return float(result.stdout.strip())
+    except Exception:
+        return None
+
+def optimize_mp4(input_path, output_path=None, preset=None, crf=23):
     """Оптимизация MP4 с сохранением качества"""
     input_str = str(input_path)
     if output_path is None:
         output_path = input_str.replace('.mp4', '_optimized.mp4')
-    
+
     orig_size = os.path.getsize(input_path)
-    
+
     try:
-        # Используем двухпроходное кодирование с оптимизацией
-        result = subprocess.run(
-            [
+        if _has_nvenc():
+            # Аппаратный энкодер: декод и энкод остаются на GPU,
+            # пресеты у nvenc свои (p1..p7), а не veryslow
+            cmd = [
+                'ffmpeg',
+                '-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda',
+                '-i', input_str,
+                '-c:v', 'h264_nvenc',
+                '-preset', 'p5',
+                '-tune', 'hq',
+                '-rc', 'vbr',
+                '-cq', str(crf),
+                '-b:v', '0',
+                '-c:a', 'aac',
+                '-b:a', '128k',
+                '-movflags', '+faststart',
+                '-y', output_path
+            ]
+        else:
+            # veryslow даёт считанные проценты к slow/medium, но в 10-40 раз
+            # медленнее; короткому клипу можно позволить slow, длинному — medium.
+            # sliced-threads добавляет параллелизм внутри кадра
+            if preset is None:
+                duration = _probe_duration(input_str)
+                preset = 'slow' if duration is not None and duration < 30 else 'medium'
+            cmd = [
                 'ffmpeg', '-i', input_str,
                 '-c:v', 'libx264',
-                '-preset', 'veryslow',
-                '-crf', '23',  # Немного выше для меньшего размера, но качество хорошее
+                '-preset', preset,
+                '-crf', str(crf),
+                '-threads', '0',
+                '-x264-params', 'sliced-threads=1',
                 '-c:a', 'aac',
                 '-b:a', '128k',
                 '-movflags', '+faststart',
                 '-y', output_path
-            ],
-            capture_output=True,
-            check=True
-        )
-        
+            ]
+        result = subprocess.run(cmd, capture_output=True, check=True)
+
         new_size = os.path.getsize(output_path)
         saved = orig_size - new_size
         if saved > 0:
@@ -133,12 +312,88 @@ def optimize_mp4(input_path, output_path=None):
             os.remove(output_path)
         return False
 
+def optimize_mp4_batch(paths, preset=None, crf=23):
+    """Оптимизация нескольких MP4 одним вызовом ffmpeg
+
+    Один запуск амортизирует старт процесса и инициализацию кодека
+    (а для NVENC — CUDA-контекст) на все клипы сразу.
+    Возвращает (сколько файлов оптимизировано, сэкономлено байт).
+    """
+    inputs = [str(p) for p in paths]
+    outputs = [p.replace('.mp4', '_optimized.mp4') for p in inputs]
+
+    if _has_nvenc():
+        video_args = ['-c:v', 'h264_nvenc', '-preset', 'p5', '-tune', 'hq',
+                      '-rc', 'vbr', '-cq', str(crf), '-b:v', '0']
+    else:
+        # Пакет — это обычно длинный суммарный хронометраж: medium
+        video_args = ['-c:v', 'libx264', '-preset', preset or 'medium', '-crf', str(crf),
+                      '-threads', '0', '-x264-params', 'sliced-threads=1']
+
+    cmd = ['ffmpeg', '-hide_banner', '-y']
+    for input_str in inputs:
+        cmd.extend(['-i', input_str])
+    for i, output_str in enumerate(outputs):
+        cmd.extend(['-map', f'{i}:v:0', '-map', f'{i}:a?'])
+        cmd.extend(video_args)
+        cmd.extend(['-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', output_str])
+
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+    except Exception as e:
+        print(f"  ❌ Ошибка пакетного MP4: {e}")
+        for output_str in outputs:
+            if os.path.exists(output_str):
+                os.remove(output_str)
+        return 0, 0
+
+    optimized = 0
+    total_saved = 0
+    for input_str, output_str in zip(inputs, outputs):
+        if not os.path.exists(output_str):
+            continue
+        orig_size = os.path.getsize(input_str)
+        new_size = os.path.getsize(output_str)
+        saved = orig_size - new_size
+        if saved > 0:
+            print(f"  ✅ MP4: {saved/1024/1024:.2f}MB сохранено ({orig_size/1024/1024:.2f}MB → {new_size/1024/1024:.2f}MB)")
+            os.replace(output_str, input_str)
+            optimized += 1
+            total_saved += saved
+        else:
+            os.remove(output_str)
+    return optimized, total_saved
+
 def optimize_jpg(input_path, output_path=None):
     """Оптимизация JPEG"""
     input_str = str(input_path)
     if output_path is None:
         output_path = input_str
-    
+
+    # Сначала jpegtran: перепаковка Хаффмана без потерь, пиксели не трогаются
+    # и полного decode+encode не происходит. Обычно даёт 5-15%.
+    if shutil.which('jpegtran'):
+        tmp_path = input_str + '.tran.jpg'
+        try:
+            result = subprocess.run(
+                ['jpegtran', '-copy', 'none', '-optimize', '-progressive',
+                 '-outfile', tmp_path, input_str],
+                capture_output=True
+            )
+            if result.returncode == 0 and os.path.exists(tmp_path):
+                orig_size = os.path.getsize(input_str)
+                new_size = os.path.getsize(tmp_path)
+                saved = orig_size - new_size
+                if saved > 0:
+                    print(f"  ✅ JPG (jpegtran): {saved/1024:.1f}KB сохранено ({orig_size/1024:.1f}KB → {new_size/1024:.1f}KB)")
+                    os.replace(tmp_path, output_path)
+                    return True
+                os.remove(tmp_path)
+                # Без потерь не ужалось — пробуем обычную перекодировку ниже
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
     try:
         img = Image.open(input_str)
         # Сохраняем с оптимизацией
@@ -164,6 +419,32 @@ def optimize_jpg(input_path, output_path=None):
         print(f"  ❌ Ошибка JPG: {e}")
         return False
 
+def _optimize_one(file_path, convert_gif_mode='none', preset=None, crf=23):
+    """Воркер пула: оптимизирует один файл, возвращает (ok, saved_bytes)"""
+    file_path = Path(file_path)
+    print(f"📄 {file_path.name}")
+
+    orig_size = os.path.getsize(file_path)
+    suffix = file_path.suffix.lower()
+
+    if suffix == '.png':
+        ok = optimize_png(file_path)
+    elif suffix == '.gif':
+        if convert_gif_mode != 'none':
+            # Конвертация кладёт результат рядом — размер GIF не меняется
+            return convert_gif(file_path, convert_gif_mode), 0
+        ok = optimize_gif(file_path)
+    elif suffix == '.mp4':
+        ok = optimize_mp4(file_path, preset=preset, crf=crf)
+    elif suffix in ('.jpg', '.jpeg'):
+        ok = optimize_jpg(file_path)
+    else:
+        print(f"  ⏭️  Пропущен (неподдерживаемый формат)")
+        return False, 0
+
+    saved = orig_size - os.path.getsize(file_path) if ok else 0
+    return ok, saved
+
 def main():
     """Основная функция"""
     import argparse
@@ -171,6 +452,11 @@ def main():
     parser = argparse.ArgumentParser(description="Оптимизация графических файлов")
     parser.add_argument("path", nargs="?", default=".", help="Путь к файлам/папке")
     parser.add_argument("--recursive", "-r", action="store_true", help="Рекурсивно обрабатывать папки")
+    parser.add_argument("--convert-gif", choices=['webp', 'mp4', 'none'], default='webp',
+                        help="Конвертировать GIF в анимированный WebP/MP4 вместо пережатия GIF")
+    parser.add_argument("--preset", default=None,
+                        help="Пресет libx264 для MP4 (по умолчанию slow для клипов <30с, иначе medium)")
+    parser.add_argument("--crf", type=int, default=23, help="CRF/CQ для MP4")
     
     args = parser.parse_args()
     
@@ -200,35 +486,37 @@ def main():
     
     total_saved = 0
     optimized = 0
-    
-    for file_path in sorted(files):
-        print(f"📄 {file_path.name}")
-        
-        orig_size = os.path.getsize(file_path)
-        
-        if file_path.suffix.lower() == '.png':
-            if optimize_png(file_path):
-                optimized += 1
-                new_size = os.path.getsize(file_path)
-                total_saved += orig_size - new_size
-        elif file_path.suffix.lower() == '.gif':
-            if optimize_gif(file_path):
-                optimized += 1
-                new_size = os.path.getsize(file_path)
-                total_saved += orig_size - new_size
-        elif file_path.suffix.lower() == '.mp4':
-            if optimize_mp4(file_path):
-                optimized += 1
-                new_size = os.path.getsize(file_path)
-                total_saved += orig_size - new_size
-        elif file_path.suffix.lower() in ('.jpg', '.jpeg'):
-            if optimize_jpg(file_path):
+
+    # PNG/JPG — CPU-bound кодеки, раскидываем по процессам.
+    # GIF/MP4 крутят свои ffmpeg/gifsicle (сами многопоточные) —
+    # им хватает узкого пула потоков, чтобы не плодить лишние ffmpeg
+    image_files = [f for f in sorted(files) if f.suffix.lower() in ('.png', '.jpg', '.jpeg')]
+    video_files = [f for f in sorted(files) if f.suffix.lower() in ('.gif', '.mp4')]
+
+    # Несколько MP4 выгоднее прогнать одним вызовом ffmpeg
+    mp4_files = [f for f in video_files if f.suffix.lower() == '.mp4']
+    if len(mp4_files) >= 2:
+        video_files = [f for f in video_files if f.suffix.lower() != '.mp4']
+        batch_ok, batch_saved = optimize_mp4_batch(mp4_files, args.preset, args.crf)
+        optimized += batch_ok
+        total_saved += batch_saved
+
+    cpu = os.cpu_count() or 4
+    futures = []
+    with ProcessPoolExecutor(max_workers=cpu) as image_pool, \
+         ThreadPoolExecutor(max_workers=max(1, cpu // 4)) as video_pool:
+        futures.extend(image_pool.submit(_optimize_one, str(f)) for f in image_files)
+        futures.extend(
+            video_pool.submit(_optimize_one, str(f), args.convert_gif, args.preset, args.crf)
+            for f in video_files
+        )
+
+        for future in as_completed(futures):
+            ok, saved = future.result()
+            if ok:
                 optimized += 1
-                new_size = os.path.getsize(file_path)
-                total_saved += orig_size - new_size
-        else:
-            print(f"  ⏭️  Пропущен (неподдерживаемый формат)")
-    
+                total_saved += saved
+
     print(f"\n✅ Готово! Оптимизировано {optimized}/{len(files)} файлов")
     if total_saved > 0:
         print(f"💾 Всего сохранено: {total_saved/1024/1024:.2f}MB")
@@ -7,10 +7,13 @@ Process Neuro presentation images:
 """
 
 import os
+import shutil
 import subprocess
 import sys
 from pathlib import Path
 
+from PIL import Image
+
 TARGET_WIDTH = 1920
 TARGET_HEIGHT = 1080
 PROCESSED_DIR = "processed"
@@ -26,93 +29,87 @@ FORMATIONS = [
 ]
 
 def get_image_size(image_path):
-    """Get image dimensions using sips"""
+    """Get image dimensions in-process via Pillow"""
     try:
-        result = subprocess.run(
-            ["sips", "-g", "pixelWidth", "-g", "pixelHeight", image_path],
-            capture_output=True,
-            text=True
-        )
-        width = None
-        height = None
-        for line in result.stdout.split('\n'):
-            if 'pixelWidth' in line:
-                width = int(line.split()[-1])
-            elif 'pixelHeight' in line:
-                height = int(line.split()[-1])
-        return width, height
-    except:
+        with Image.open(image_path) as img:
+            return img.size
+    except Exception:
         return None, None
 
 def process_image(input_path, output_path):
-    """Process single image: resize, pad, optimize"""
+    """Process single image: resize, pad, optimize — all in-process.
+
+    The old path spawned 3-4 `sips` subprocesses per image (macOS only,
+    ~tens of ms each just on fork/exec); Pillow does the same resize +
+    pad + encode without leaving the process.
+    """
     print(f"  Processing: {input_path.name}")
-    
-    # Get original size
-    orig_w, orig_h = get_image_size(str(input_path))
-    if not orig_w or not orig_h:
-        print(f"    ⚠️  Could not read image size, skipping")
+
+    try:
+        img = Image.open(input_path).convert('RGB')
+    except Exception:
+        print(f"    ⚠️  Could not read image, skipping")
         return False
-    
+
+    orig_w, orig_h = img.size
     print(f"    Original: {orig_w}x{orig_h}")
-    
+
     # Calculate scaling to fit within 1920x1080
-    scale_w = TARGET_WIDTH / orig_w
-    scale_h = TARGET_HEIGHT / orig_h
-    scale = min(scale_w, scale_h)
-    
+    scale = min(TARGET_WIDTH / orig_w, TARGET_HEIGHT / orig_h)
     new_w = int(orig_w * scale)
     new_h = int(orig_h * scale)
-    
-    # Resize first (maintain aspect ratio)
-    temp_path = str(output_path).replace('.png', '_temp.png')
+
     try:
-        subprocess.run(
-            ["sips", "-z", str(new_h), str(new_w), str(input_path), "--out", temp_path],
-            capture_output=True,
-            check=True
-        )
-        
-        # Pad to exact 1920x1080 with black background
-        # Calculate padding
-        pad_x = (TARGET_WIDTH - new_w) // 2
-        pad_y = (TARGET_HEIGHT - new_h) // 2
-        
-        # Use sips to pad (create white/transparent background, then composite)
-        # Actually, sips padToHeightWidth should work
-        subprocess.run(
-            ["sips", "--padToHeightWidth", str(TARGET_HEIGHT), str(TARGET_WIDTH), 
-             "--padColor", "000000", temp_path, "--out", str(output_path)],
-            capture_output=True,
-            check=True
-        )
-        
-        # Remove temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        
-        # Optimize: re-encode with compression
-        subprocess.run(
-            ["sips", "-s", "format", "png", "-s", "formatOptions", "80", 
-             str(output_path), "--out", str(output_path)],
-            capture_output=True,
-            check=False  # Not critical
-        )
-        
-        # Get final size
-        final_size = os.path.getsize(output_path)
-        final_mb = final_size / (1024 * 1024)
-        final_w, final_h = get_image_size(str(output_path))
-        
-        print(f"    ✓ Final: {final_w}x{final_h}, {final_mb:.2f}MB")
+        # Resize (maintain aspect ratio), pad to exact 1920x1080 with black
+        img = img.resize((new_w, new_h), Image.LANCZOS)
+        canvas = Image.new('RGB', (TARGET_WIDTH, TARGET_HEIGHT), (0, 0, 0))
+        canvas.paste(img, ((TARGET_WIDTH - new_w) // 2, (TARGET_HEIGHT - new_h) // 2))
+        canvas.save(output_path, 'PNG', optimize=True, compress_level=9)
+
+        final_mb = os.path.getsize(output_path) / (1024 * 1024)
+        print(f"    ✓ Final: {TARGET_WIDTH}x{TARGET_HEIGHT}, {final_mb:.2f}MB")
         return True
-        
-    except subprocess.CalledProcessError as e:
+
+    except Exception as e:
         print(f"    ⚠️  Error processing: {e}")
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
         return False
 
+def quantize_formation_group(paths):
+    """Quantize all frames of one formation with a single shared palette.
+
+    A per-frame palette wastes bytes and flickers between frames; pngquant
+    --map reuses one 256-color palette across the whole group.
+    """
+    if len(paths) < 2 or not shutil.which("pngquant"):
+        return
+
+    # Median-sized frame is the most representative palette source
+    paths = sorted(paths, key=os.path.getsize)
+    reference = paths[len(paths) // 2]
+    palette_path = str(reference) + ".palette.png"
+
+    result = subprocess.run(
+        ["pngquant", "--quality=70-95", "--force",
+         "--output", palette_path, str(reference)],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        return
+
+    for path in paths:
+        quant_path = str(path) + ".q.png"
+        result = subprocess.run(
+            ["pngquant", "--map", palette_path, "--force",
+             "--output", quant_path, str(path)],
+            capture_output=True
+        )
+        if result.returncode == 0 and os.path.getsize(quant_path) < os.path.getsize(path):
+            os.replace(quant_path, path)
+        elif os.path.exists(quant_path):
+            os.remove(quant_path)
+
+    os.remove(palette_path)
+
 def main():
     script_dir = Path(__file__).parent
     os.chdir(script_dir)
@@ -128,21 +125,28 @@ def main():
     print(f"Found {len(files)} images to process\n")
     
     counter = 0
+    formation_groups = {}
     for i, file in enumerate(files):
         # Determine formation (cycle through 7)
         formation_idx = i % len(FORMATIONS)
         frame_num = (i // len(FORMATIONS)) + 1
-        
+
         formation_name = FORMATIONS[formation_idx]
         output_name = f"{formation_name}_frame{frame_num:02d}.png"
         output_path = processed_path / output_name
-        
+
         print(f"[{i+1}/{len(files)}] {output_name}")
-        
+
         if process_image(file, output_path):
             counter += 1
+            formation_groups.setdefault(formation_name, []).append(output_path)
         print()
-    
+
+    # Re-quantize each formation's frames against one shared palette
+    for formation_name, group in formation_groups.items():
+        print(f"🎨 Shared palette: {formation_name} ({len(group)} frames)")
+        quantize_formation_group(group)
+
     print(f"✅ Processing complete!")
     print(f"   Successfully processed: {counter}/{len(files)} images")
     print(f"   Output directory: {processed_path.absolute()}")
@@ -12,25 +12,38 @@ Neuro Video Processor
 - Edge enhancement (границы сознания)
 """
 
+import functools
 import os
+import subprocess
 import sys
+import threading
 import numpy as np
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Tuple, Optional
-import warnings
-warnings.filterwarnings('ignore')
+
+cv2 = None
+
+
+def _load_cv2():
+    """Ленивый импорт cv2: тяжёлые библиотеки не грузятся ради --help
+    или ошибки в аргументах (секунды холодного старта). Повторный вызов
+    бесплатен."""
+    global cv2
+    if cv2 is None:
+        try:
+            import cv2 as _cv2
+        except ImportError as e:
+            print(f"❌ Missing dependency: {e}")
+            print("📦 Install: pip install moviepy opencv-python numpy pillow scipy")
+            sys.exit(1)
+        cv2 = _cv2
+    return cv2
 
 try:
-    from moviepy.editor import VideoFileClip, ImageSequenceClip, CompositeVideoClip, AudioFileClip, concatenate_videoclips
-    from moviepy.video.fx.all import fadein, fadeout
-    import cv2
-    from PIL import Image, ImageFilter, ImageEnhance
-    from scipy import ndimage
-    from scipy.signal import butter, filtfilt
-except ImportError as e:
-    print(f"❌ Missing dependency: {e}")
-    print("📦 Install: pip install moviepy opencv-python numpy pillow scipy")
-    sys.exit(1)
+    from numba import njit, prange
+except ImportError:  # numba опционален — остаётся путь NumPy/OpenCV
+    njit = None
 
 
 # ============================================================================
@@ -45,86 +58,168 @@ NEURO_PALETTE = {
 }
 
 
+# ============================================================================
+# РАБОЧИЕ БУФЕРЫ КАДРА
+# ============================================================================
+
+@dataclass
+class FrameWorkspace:
+    """Переиспользуемые буферы под размер кадра — эффекты пишут в них
+    вместо того, чтобы дёргать аллокатор на каждый кадр (~6-25 МБ на 1080p)."""
+    buf_f32: np.ndarray
+    out_u8: np.ndarray
+    rng: np.random.Generator
+    prev_gray: Optional[np.ndarray] = None
+    prev_edges: Optional[np.ndarray] = None
+
+    @classmethod
+    def for_shape(cls, h: int, w: int) -> "FrameWorkspace":
+        return cls(
+            buf_f32=np.empty((h, w, 3), dtype=np.float32),
+            out_u8=np.empty((h, w, 3), dtype=np.uint8),
+            # Philox вместо легаси Mersenne-Twister: векторизован внутри
+            # NumPy и без глобальной блокировки RandomState — свой генератор
+            # на workspace не конкурирует между потоками
+            rng=np.random.Generator(np.random.Philox()),
+        )
+
+
+_WORKSPACES: dict = {}
+
+
+def _workspace(h: int, w: int) -> FrameWorkspace:
+    # Ключ включает поток: при thread-параллельной обработке кадров
+    # каждый поток работает со своими буферами и своим RNG
+    key = (h, w, threading.get_ident())
+    ws = _WORKSPACES.get(key)
+    if ws is None:
+        ws = FrameWorkspace.for_shape(h, w)
+        _WORKSPACES[key] = ws
+    return ws
+
+
 # ============================================================================
 # ФИЛЬТРЫ И ЭФФЕКТЫ
 # ============================================================================
 
+def fast_blur(frame: np.ndarray, sigma: float) -> np.ndarray:
+    """
+    Три прохода box-блюра ≈ гауссиана (центральная предельная теорема),
+    но каждый проход — O(1) на пиксель независимо от радиуса.
+    Для bloom-эффекта разница с честной гауссианой не видна.
+    """
+    r = max(1, int(sigma))
+    ksize = (2 * r + 1, 2 * r + 1)
+    out = frame
+    for _ in range(3):
+        out = cv2.boxFilter(out, -1, ksize, borderType=cv2.BORDER_REPLICATE)
+    return out
+
+
 def glow_filter(frame: np.ndarray, intensity: float = 0.3) -> np.ndarray:
     """
     Усиливает свет, символизируя осознанное внимание.
     Применяет bloom-эффект через размытие и аддитивное смешивание.
     """
-    # Gaussian blur для создания свечения
-    blurred = cv2.GaussianBlur(frame, (0, 0), sigmaX=intensity * 10, sigmaY=intensity * 10)
+    # Стопка box-блюров для создания свечения
+    blurred = fast_blur(frame, intensity * 10)
     # Аддитивное смешивание для усиления света
     glow = cv2.addWeighted(frame, 1.0, blurred, intensity, 0)
     return np.clip(glow, 0, 255).astype(np.uint8)
 
 
-def edge_enhancement(frame: np.ndarray, strength: float = 0.2) -> np.ndarray:
+def _edges_cached(frame: np.ndarray, ws: FrameWorkspace) -> np.ndarray:
+    """Canny с кэшем на соседние кадры.
+
+    В vlog-футаже соседние кадры почти идентичны; если средний absdiff
+    по серому меньше порога, края прошлого кадра переиспользуются —
+    самая дорогая per-frame операция OpenCV пропускается."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    if ws.prev_edges is not None:
+        delta = cv2.absdiff(gray, ws.prev_gray).mean()
+        if delta < 3.0:
+            ws.prev_gray = gray
+            return ws.prev_edges
+    edges = cv2.Canny(gray, 50, 150)
+    ws.prev_gray = gray
+    ws.prev_edges = edges
+    return edges
+
+
+def edge_enhancement(frame: np.ndarray, strength: float = 0.2,
+                     ws: Optional[FrameWorkspace] = None) -> np.ndarray:
     """
     Подчёркивает границы между мыслью и материей.
     Использует Canny edge detection с мягким наложением.
     """
-    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-    edges = cv2.Canny(gray, 50, 150)
+    if ws is not None:
+        edges = _edges_cached(frame, ws)
+    else:
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        edges = cv2.Canny(gray, 50, 150)
     edges_colored = cv2.cvtColor(edges, cv2.COLOR_GRAY2RGB)
     # Мягкое наложение краёв
     enhanced = cv2.addWeighted(frame, 1.0 - strength, edges_colored, strength, 0)
     return np.clip(enhanced, 0, 255).astype(np.uint8)
 
 
-def color_shift(frame: np.ndarray, t: float) -> np.ndarray:
+@functools.lru_cache(maxsize=8)
+def _channel_gradient(w: int) -> np.ndarray:
+    """Градиент ночь→фиолет по ширине кадра, (1, w, 3) float32 — кэшируется."""
+    gradient = np.linspace(0, 1, w, dtype=np.float32)[None, :, None]
+    night = NEURO_PALETTE['deep_night'].astype(np.float32)
+    violet = NEURO_PALETTE['violet'].astype(np.float32)
+    return night + (violet - night) * gradient
+
+
+def color_shift(frame: np.ndarray, t: float, ws: Optional[FrameWorkspace] = None) -> np.ndarray:
     """
     Трансформирует реальность в пространство сознания.
     Применяет градиентную цветовую трансформацию в нейронную палитру.
     """
     h, w = frame.shape[:2]
-    
-    # Создаём градиент от глубокой ночи к фиолетовому
-    gradient = np.linspace(0, 1, w)
-    gradient = np.tile(gradient, (h, 1))
-    
+    if ws is None:
+        ws = _workspace(h, w)
+
     # Пульсирующая интенсивность трансформации
     pulse = 0.5 + 0.3 * np.sin(t * 0.5)
-    
-    result = frame.copy().astype(np.float32)
-    
-    # Смешиваем с нейронной палитрой
-    for i in range(3):
-        night_val = NEURO_PALETTE['deep_night'][i]
-        violet_val = NEURO_PALETTE['violet'][i]
-        channel_gradient = night_val + (violet_val - night_val) * gradient
-        result[:, :, i] = result[:, :, i] * (1 - pulse * 0.4) + channel_gradient * (pulse * 0.4)
-    
-    return np.clip(result, 0, 255).astype(np.uint8)
+    mix = pulse * 0.4
+
+    # Смешиваем с нейронной палитрой одним броадкастом по всем каналам,
+    # всё — в заранее выделенных буферах
+    result = ws.buf_f32
+    np.multiply(frame, 1 - mix, out=result)
+    result += _channel_gradient(w) * mix
+
+    np.clip(result, 0, 255, out=result)
+    np.copyto(ws.out_u8, result, casting="unsafe")
+    return ws.out_u8
 
 
-def photonic_noise(frame: np.ndarray, t: float, density: float = 0.01) -> np.ndarray:
+def photonic_noise(frame: np.ndarray, t: float, density: float = 0.01,
+                   ws: Optional[FrameWorkspace] = None) -> np.ndarray:
     """
     Представляет квантовую неопределённость и случайность.
     Добавляет светящиеся точки, движущиеся по синусоидальному паттерну.
+    Все точки генерируются одним векторизованным проходом NumPy.
     """
     h, w = frame.shape[:2]
-    result = frame.copy().astype(np.float32)
-    
-    # Генерируем случайные точки с синусоидальным движением
+    if ws is None:
+        ws = _workspace(h, w)
+    result = frame.astype(np.float32)
+
+    # Генерируем сразу все случайные точки с синусоидальным движением
     num_points = int(h * w * density)
-    
-    for _ in range(num_points):
-        x = int(np.random.uniform(0, w))
-        y = int(np.random.uniform(0, h))
-        
-        # Синусоидальное движение
-        offset_x = int(5 * np.sin(t * 2 + y * 0.01))
-        offset_y = int(5 * np.cos(t * 2 + x * 0.01))
-        px = (x + offset_x) % w
-        py = (y + offset_y) % h
-        
-        # Светящаяся точка (лазурный цвет)
-        if 0 <= px < w and 0 <= py < h:
-            result[py, px, :] = np.minimum(result[py, px, :] + NEURO_PALETTE['azure'] * 0.3, 255)
-    
+
+    xs = ws.rng.integers(0, w, size=num_points, dtype=np.int32)
+    ys = ws.rng.integers(0, h, size=num_points, dtype=np.int32)
+
+    px = (xs + (5 * np.sin(t * 2 + ys * 0.01)).astype(np.int64)) % w
+    py = (ys + (5 * np.cos(t * 2 + xs * 0.01)).astype(np.int64)) % h
+
+    # Светящиеся точки (лазурный цвет)
+    np.add.at(result, (py, px), NEURO_PALETTE['azure'] * 0.3)
+
     return np.clip(result, 0, 255).astype(np.uint8)
 
 
@@ -143,7 +238,7 @@ def breath_rhythm(frame: np.ndarray, t: float, period: float = 6.0) -> np.ndarra
     # Применяем размытие пропорционально дыханию
     blur_amount = int(breath * 2)
     if blur_amount > 0:
-        blurred = cv2.GaussianBlur(frame, (0, 0), sigmaX=blur_amount, sigmaY=blur_amount)
+        blurred = fast_blur(frame, blur_amount)
         # Смешиваем с оригиналом
         result = cv2.addWeighted(frame, 1.0 - breath * 0.3, blurred, breath * 0.3, 0)
     else:
@@ -160,29 +255,140 @@ def breath_rhythm(frame: np.ndarray, t: float, period: float = 6.0) -> np.ndarra
 # ОСНОВНАЯ ФУНКЦИЯ ОБРАБОТКИ КАДРА
 # ============================================================================
 
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def _fused_blend(frame, edges, glow_blur, breath_blur,
+                     edge_strength, glow_intensity, breath_mix, brightness, out):
+        """Края + свечение + дыхание одним проходом по пикселям.
+
+        out может совпадать с frame: каждый пиксель читается до записи."""
+        h, w = frame.shape[:2]
+        inv_edge = 1.0 - edge_strength
+        inv_breath = 1.0 - breath_mix
+        for y in prange(h):
+            for x in range(w):
+                e = edges[y, x] * edge_strength
+                for c in range(3):
+                    v = frame[y, x, c] * inv_edge + e
+                    v += glow_blur[y, x, c] * glow_intensity
+                    v = v * inv_breath + breath_blur[y, x, c] * breath_mix
+                    v *= brightness
+                    if v > 255.0:
+                        v = 255.0
+                    out[y, x, c] = np.uint8(v)
+        return out
+
+
+
 def process_frame(frame: np.ndarray, t: float) -> np.ndarray:
     """
     Применяет все эффекты к одному кадру.
     Порядок важен для визуального результата.
     """
+    ws = _workspace(frame.shape[0], frame.shape[1])
+
     # 1. Цветовая трансформация (базовая палитра)
-    frame = color_shift(frame, t)
-    
-    # 2. Усиление краёв (границы сознания)
-    frame = edge_enhancement(frame, strength=0.15)
-    
-    # 3. Свечение (осознанное внимание)
-    frame = glow_filter(frame, intensity=0.25)
-    
-    # 4. Ритм дыхания (жизненный цикл)
-    frame = breath_rhythm(frame, t, period=6.0)
-    
+    frame = color_shift(frame, t, ws)
+
+    if njit is not None:
+        # Canny и Gaussian остаются в OpenCV (там уже SIMD),
+        # а все поточечные смешивания сливаются в один numba-проход —
+        # вместо четырёх полных обходов кадра с временными массивами
+        edges = _edges_cached(frame, ws)
+        glow_blur = fast_blur(frame, 2.5)
+
+        phase = 2 * np.pi * t / 6.0
+        breath = np.sin((phase + np.pi / 2) / 2) * 0.6 + 0.5
+        blur_amount = int(breath * 2)
+        if blur_amount > 0:
+            breath_blur = fast_blur(frame, blur_amount)
+            breath_mix = breath * 0.3
+        else:
+            breath_blur = frame
+            breath_mix = 0.0
+
+        frame = _fused_blend(frame, edges, glow_blur, breath_blur,
+                             0.15, 0.25, breath_mix, 1.0 + breath * 0.1, ws.out_u8)
+    else:
+        # 2. Усиление краёв (границы сознания)
+        frame = edge_enhancement(frame, strength=0.15, ws=ws)
+
+        # 3. Свечение (осознанное внимание)
+        frame = glow_filter(frame, intensity=0.25)
+
+        # 4. Ритм дыхания (жизненный цикл)
+        frame = breath_rhythm(frame, t, period=6.0)
+
     # 5. Фотонный шум (квантовая неопределённость)
-    frame = photonic_noise(frame, t, density=0.008)
-    
+    frame = photonic_noise(frame, t, density=0.008, ws=ws)
+
     return frame
 
 
+# ============================================================================
+# GPU-ПУТЬ (cv2.cuda, опционально)
+# ============================================================================
+
+def cuda_available() -> bool:
+    """True, если OpenCV собран с CUDA и есть хотя бы одно устройство"""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except Exception:
+        return False
+
+
+_CUDA_GAUSS_CACHE: dict = {}
+
+
+def _cuda_gauss(sigma: float):
+    """Кэшированный CUDA-фильтр Гаусса для заданной сигмы"""
+    gauss = _CUDA_GAUSS_CACHE.get(sigma)
+    if gauss is None:
+        radius = int(3 * sigma + 0.5)
+        ksize = min(2 * radius + 1, 31)
+        gauss = cv2.cuda.createGaussianFilter(cv2.CV_8UC3, cv2.CV_8UC3, (ksize, ksize), sigma)
+        _CUDA_GAUSS_CACHE[sigma] = gauss
+    return gauss
+
+
+def process_frame_gpu(frame: np.ndarray, t: float) -> np.ndarray:
+    """
+    Тот же стек эффектов, но блюры/края/смешивания — на GPU.
+    Кадр загружается в VRAM один раз и скачивается один раз.
+    """
+    # 1. Цветовая трансформация (CPU, уже векторизована)
+    frame = color_shift(frame, t)
+
+    gpu = cv2.cuda_GpuMat()
+    gpu.upload(frame)
+
+    # 2. Усиление краёв
+    gray = cv2.cuda.cvtColor(gpu, cv2.COLOR_RGB2GRAY)
+    canny = cv2.cuda.createCannyEdgeDetector(50, 150)
+    edges = canny.detect(gray)
+    edges_rgb = cv2.cuda.cvtColor(edges, cv2.COLOR_GRAY2RGB)
+    gpu = cv2.cuda.addWeighted(gpu, 0.85, edges_rgb, 0.15, 0)
+
+    # 3. Свечение
+    blurred = _cuda_gauss(2.5).apply(gpu)
+    gpu = cv2.cuda.addWeighted(gpu, 1.0, blurred, 0.25, 0)
+
+    # 4. Ритм дыхания
+    phase = 2 * np.pi * t / 6.0
+    breath = np.sin((phase + np.pi / 2) / 2) * 0.6 + 0.5
+    blur_amount = int(breath * 2)
+    if blur_amount > 0:
+        breath_blur = _cuda_gauss(float(blur_amount)).apply(gpu)
+        gpu = cv2.cuda.addWeighted(gpu, 1.0 - breath * 0.3, breath_blur, breath * 0.3, 0)
+    gpu = gpu.convertTo(cv2.CV_8U, alpha=1.0 + breath * 0.1)
+
+    frame = gpu.download()
+
+    # 5. Фотонный шум (CPU — точечный scatter, GPU не выигрывает)
+    return photonic_noise(frame, t, density=0.008)
+
+
 # ============================================================================
 # ГЕНЕРАЦИЯ АУДИО
 # ============================================================================
@@ -190,26 +396,32 @@ def process_frame(frame: np.ndarray, t: float) -> np.ndarray:
 def generate_breath_audio(duration: float, fps: int = 44100) -> np.ndarray:
     """
     Генерирует низкий гул или heartbeat-loop для атмосферы.
+    Всё считается в float32 по месту — без float64-временных на всю дорожку.
     """
-    t = np.linspace(0, duration, int(fps * duration))
-    
+    n = int(fps * duration)
+    t = np.arange(n, dtype=np.float32)
+    t /= fps
+
     # Низкий гул (бас)
-    bass = 0.1 * np.sin(2 * np.pi * 30 * t)
-    
-    # Heartbeat-ритм (пульсация каждые ~1.2 секунды)
-    heartbeat = np.zeros_like(t)
+    audio = np.sin(np.float32(2 * np.pi * 30) * t)
+    audio *= 0.1
+
+    # Heartbeat-ритм (пульсация каждые ~1.2 секунды): один
+    # предрассчитанный экспоненциальный хвост вместо exp+linspace на удар
+    beat_len = int(0.1 * fps)
+    beat = 0.05 * np.exp(-np.linspace(0, 10, beat_len, dtype=np.float32))
     for i in range(int(duration / 1.2)):
         start = int(i * 1.2 * fps)
-        end = int((i * 1.2 + 0.1) * fps)
-        if end < len(heartbeat):
-            heartbeat[start:end] = 0.05 * np.exp(-np.linspace(0, 10, end - start))
-    
+        end = start + beat_len
+        if end < n:
+            audio[start:end] += beat
+
     # Дыхание (6-секундный цикл)
-    breath = 0.05 * np.sin(2 * np.pi * t / 6.0)
-    
-    audio = bass + heartbeat + breath
-    audio = audio / np.max(np.abs(audio)) * 0.3  # Нормализация
-    
+    audio += np.float32(0.05) * np.sin(np.float32(2 * np.pi / 6.0) * t)
+
+    # Нормализация
+    audio *= 0.3 / np.max(np.abs(audio))
+
     return audio
 
 
@@ -223,139 +435,304 @@ def process_neuro_video(
     gif_path: Optional[str] = "neuro_teaser.gif",
     gif_duration: float = 5.0,
     fps: int = 24,
-    add_audio: bool = True
+    add_audio: bool = True,
+    use_gpu: bool = False
 ) -> None:
     """
     Обрабатывает видео со всеми эффектами Neuro.
     """
     print(f"🎬 Загрузка видео: {input_path}")
-    
+
     if not os.path.exists(input_path):
         print(f"❌ Файл не найден: {input_path}")
         return
-    
+
+    _load_cv2()
+    try:
+        from moviepy.editor import VideoFileClip
+    except ImportError as e:
+        print(f"❌ Missing dependency: {e}")
+        print("📦 Install: pip install moviepy opencv-python numpy pillow scipy")
+        sys.exit(1)
+
     # Загружаем видео
     clip = VideoFileClip(input_path)
-    original_duration = clip.duration
-    
-    print(f"📊 Исходное видео: {original_duration:.2f} сек, {clip.fps} fps, {clip.size}")
-    
-    # Применяем эффекты к каждому кадру
+    duration = clip.duration
+    w, h = clip.size
+
+    print(f"📊 Исходное видео: {duration:.2f} сек, {clip.fps} fps, {clip.size}")
+
+    # Аудио: сгенерированный фон уходит сырыми s16le-сэмплами через
+    # отдельный pipe-дескриптор — без WAV-файла, временных путей и
+    # round-trip через файловую систему; дорожка исходника — вторым входом
+    audio_args = []
+    audio_bytes = None
+    audio_read_fd = audio_write_fd = None
+    if add_audio:
+        if clip.audio is None:
+            print("🔊 Генерация аудиофона...")
+            audio_data = generate_breath_audio(duration)
+            np.multiply(audio_data, 32767, out=audio_data)
+            audio_bytes = audio_data.astype('<i2').tobytes()
+            audio_read_fd, audio_write_fd = os.pipe()
+            audio_args = ['-f', 's16le', '-ar', '44100', '-ac', '1',
+                          '-i', f'pipe:{audio_read_fd}',
+                          '-map', '0:v', '-map', '1:a',
+                          '-c:a', 'aac', '-b:a', '192k', '-shortest']
+        else:
+            audio_args = ['-i', input_path, '-map', '0:v', '-map', '1:a?',
+                          '-c:a', 'aac', '-b:a', '192k', '-shortest']
+
     print("✨ Применение эффектов...")
-    processed_clip = clip.fl(lambda gf, t: process_frame(gf(t), t))
-    
-    # Добавляем fade-in/fade-out для плавности
-    processed_clip = processed_clip.fx(fadein, 0.5)
-    processed_clip = processed_clip.fx(fadeout, 1.0)
-    
-    # Генерируем аудио (если нужно)
-    if add_audio and clip.audio is None:
-        print("🔊 Генерация аудиофона...")
-        from scipy.io import wavfile
-        import tempfile
-        
-        audio_data = generate_breath_audio(processed_clip.duration)
-        temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-        wavfile.write(temp_audio.name, 44100, (audio_data * 32767).astype(np.int16))
-        temp_audio.close()
-        
-        audio_clip = AudioFileClip(temp_audio.name)
-        processed_clip = processed_clip.set_audio(audio_clip)
-        
-        # Удаляем временный файл после использования
-        def cleanup():
-            os.unlink(temp_audio.name)
-            audio_clip.close()
-        processed_clip = processed_clip.on_close(cleanup)
-    
-    # Экспортируем обработанное видео
+    frame_fn = process_frame
+    use_pool = True
+    if use_gpu:
+        if cuda_available():
+            print("🖥️ GPU-путь: cv2.cuda")
+            frame_fn = process_frame_gpu
+            use_pool = False  # CUDA-контекст не переживает форк, GPU и так параллелен
+        else:
+            print("⚠️ CUDA недоступна, обрабатываю на CPU")
+
+    # Кадры уходят сырыми байтами в stdin ffmpeg, а эффекты считаются
+    # пулом процессов — декод, CPU-эффекты и энкод идут внахлёст вместо
+    # одного потока через moviepy
     print(f"💾 Сохранение: {output_path}")
-    processed_clip.write_videofile(
-        output_path,
-        fps=fps,
-        codec='libx264',
-        preset='slow',
-        bitrate='5000k',
-        audio_codec='aac',
-        audio_bitrate='192k'
+    encoder = subprocess.Popen(
+        [
+            'ffmpeg', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{w}x{h}',
+            '-r', str(fps), '-i', '-',
+            *audio_args,
+            '-vf', f'fade=t=in:st=0:d=0.5,fade=t=out:st={max(0.0, duration - 1.0):.3f}:d=1',
+            *(_encoder_args()),
+            '-pix_fmt', 'yuv420p',
+            output_path,
+        ],
+        stdin=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        bufsize=10**8,
+        pass_fds=(audio_read_fd,) if audio_read_fd is not None else (),
     )
-    
-    # Создаём GIF-тизер (первые N секунд)
-    if gif_path:
-        teaser_duration = min(gif_duration, processed_clip.duration)
-        print(f"🎞️ Создание GIF-тизера ({teaser_duration:.1f} сек): {gif_path}")
-        teaser = processed_clip.subclip(0, teaser_duration)
-        teaser.write_gif(
-            gif_path,
-            fps=15,
-            program='ffmpeg',
-            opt='optimizeplus'
-        )
-        teaser.close()
-    
-    # Очистка
-    processed_clip.close()
+
+    # Аудио пишет отдельный поток: пайп блокируется на ёмкости,
+    # а главный поток в это время гонит видеокадры
+    audio_feeder = None
+    if audio_bytes is not None:
+        os.close(audio_read_fd)
+
+        def _feed_audio():
+            with os.fdopen(audio_write_fd, 'wb') as audio_pipe:
+                audio_pipe.write(audio_bytes)
+
+        audio_feeder = threading.Thread(target=_feed_audio, daemon=True)
+        audio_feeder.start()
+
+    # Кадры тизера откладываются прямо из основного прохода (в темпе GIF,
+    # чтобы не держать лишнего в памяти) — эффекты не пересчитываются
+    gif_fps = 15
+    teaser_frames = []
+    teaser_n = int(min(gif_duration, duration) * fps) if gif_path else 0
+
+    def cache_teaser(i, processed):
+        if i < teaser_n and i * gif_fps >= len(teaser_frames) * fps:
+            teaser_frames.append(processed.copy())
+
+    indexed = ((frame, i / fps)
+               for i, frame in enumerate(clip.iter_frames(fps=fps, dtype='uint8')))
+    workers = max(1, (os.cpu_count() or 2) - 1)
+    if use_pool and njit is not None:
+        # numba-ядра собраны с nogil — потоки считают кадры по-настоящему
+        # параллельно, а HxWx3-кадры не сериализуются между процессами.
+        # Окно ограничено, чтобы декод не убегал вперёд по памяти
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+
+        i = 0
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            pending = deque()
+            for item in indexed:
+                pending.append(ex.submit(_process_indexed, item))
+                if len(pending) > workers * 2:
+                    processed = pending.popleft().result()
+                    cache_teaser(i, processed)
+                    encoder.stdin.write(processed.tobytes())
+                    i += 1
+            while pending:
+                processed = pending.popleft().result()
+                cache_teaser(i, processed)
+                encoder.stdin.write(processed.tobytes())
+                i += 1
+    elif use_pool:
+        import multiprocessing
+        with multiprocessing.Pool(workers) as pool:
+            for i, processed in enumerate(pool.imap(_process_indexed, indexed, chunksize=8)):
+                cache_teaser(i, processed)
+                encoder.stdin.write(processed.tobytes())
+    else:
+        for i, (frame, t) in enumerate(indexed):
+            processed = np.ascontiguousarray(frame_fn(frame, t))
+            cache_teaser(i, processed)
+            encoder.stdin.write(processed.tobytes())
+
+    encoder.stdin.close()
+    encoder.wait()
+
+    if audio_feeder is not None:
+        audio_feeder.join()
+
+    # Создаём GIF-тизер (первые N секунд) из уже готовых кадров
+    if gif_path and teaser_frames:
+        print(f"🎞️ Создание GIF-тизера ({len(teaser_frames) / gif_fps:.1f} сек): {gif_path}")
+        _write_teaser_gif(teaser_frames, (w, h), gif_path, gif_fps)
+
     clip.close()
-    
+
     print("✅ Готово!")
 
 
+def _process_indexed(args):
+    """Воркер пула: (кадр, t) → обработанный кадр"""
+    # При spawn-старте (macOS/Windows) воркер импортирует модуль заново
+    # и ленивый cv2 ещё не загружен — догружаем перед обработкой
+    _load_cv2()
+    frame, t = args
+    return process_frame(frame, t)
+
+
+def _write_teaser_gif(frames, size, gif_path, gif_fps=15):
+    """Кодирует GIF-тизер из уже обработанных кадров одним вызовом ffmpeg"""
+    w, h = size
+    encoder = subprocess.Popen(
+        [
+            'ffmpeg', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{w}x{h}',
+            '-r', str(gif_fps), '-i', '-',
+            '-vf', 'fade=t=in:st=0:d=0.5,split[a][b];[a]palettegen[p];[b][p]paletteuse',
+            gif_path,
+        ],
+        stdin=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        bufsize=10**8,
+    )
+    for frame in frames:
+        encoder.stdin.write(np.ascontiguousarray(frame).tobytes())
+    encoder.stdin.close()
+    encoder.wait()
+
+
 # ============================================================================
 # АЛЬТЕРНАТИВА: ОБРАБОТКА ИЗ СКРИНШОТОВ
 # ============================================================================
 
+_NVENC_AVAILABLE = None
+
+
+def _has_nvenc() -> bool:
+    """Проверяет наличие h264_nvenc в сборке ffmpeg (кэшируется)"""
+    global _NVENC_AVAILABLE
+    if _NVENC_AVAILABLE is None:
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-encoders'],
+                capture_output=True, text=True
+            )
+            _NVENC_AVAILABLE = result.returncode == 0 and 'h264_nvenc' in result.stdout
+        except FileNotFoundError:
+            _NVENC_AVAILABLE = False
+    return _NVENC_AVAILABLE
+
+
+def _encoder_args(crf: int = 20) -> list:
+    """Видеокодек для ffmpeg-команд: NVENC, если доступен, иначе libx264+CRF"""
+    if _has_nvenc():
+        return ['-c:v', 'h264_nvenc', '-preset', 'p5', '-tune', 'hq',
+                '-rc', 'vbr', '-cq', str(crf), '-b:v', '0']
+    return ['-c:v', 'libx264', '-preset', 'medium', '-crf', str(crf)]
+
+
 def process_from_screenshots(
     screenshots_dir: str,
     output_path: str = "neuro_from_screenshots.mp4",
     fps: int = 2
 ) -> None:
     """
-    Собирает видео из скриншотов в processed/ с применением эффектов.
+    Собирает видео из скриншотов с применением эффектов.
+    Кадры уходят сырыми байтами прямо в stdin ffmpeg — без N промежуточных
+    ImageSequenceClip и без удержания всех кадров в памяти.
     """
     screenshots_path = Path(screenshots_dir)
     if not screenshots_path.exists():
         print(f"❌ Папка не найдена: {screenshots_dir}")
         return
-    
+
+    _load_cv2()
+
     # Находим все PNG файлы
     image_files = sorted(screenshots_path.glob("*.png"))
     if not image_files:
         print(f"❌ Изображения не найдены в {screenshots_dir}")
         return
-    
+
     print(f"🖼️ Найдено {len(image_files)} изображений")
-    
-    # Загружаем и обрабатываем каждое изображение
-    clips = []
-    for i, img_path in enumerate(image_files):
-        frame = np.array(Image.open(img_path).convert('RGB'))
-        t = i / fps  # Время для эффектов
-        processed_frame = process_frame(frame, t)
-        
-        # Создаём короткий клип из кадра
-        img_clip = ImageSequenceClip([processed_frame], fps=fps)
-        clips.append(img_clip)
-    
-    # Собираем в одно видео
-    final_clip = concatenate_videoclips(clips, method="compose")
-    
-    # Добавляем fade
-    final_clip = final_clip.fx(fadein, 0.5)
-    final_clip = final_clip.fx(fadeout, 1.0)
-    
+
+    first = cv2.imread(str(image_files[0]), cv2.IMREAD_COLOR)
+    h, w = first.shape[:2]
+    duration = len(image_files) / fps
+
+    vcodec = _encoder_args(23)
+
     print(f"💾 Сохранение: {output_path}")
-    final_clip.write_videofile(
-        output_path,
-        fps=fps,
-        codec='libx264',
-        preset='slow',
-        bitrate='5000k'
+    encoder = subprocess.Popen(
+        [
+            'ffmpeg', '-y',
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            '-s', f'{w}x{h}',
+            '-r', str(fps),
+            '-i', '-',
+            '-vf', f'fade=t=in:st=0:d=0.5,fade=t=out:st={max(0.0, duration - 1.0):.3f}:d=1',
+            *vcodec,
+            '-pix_fmt', 'yuv420p',
+            output_path,
+        ],
+        stdin=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        bufsize=10**8,
     )
-    
-    final_clip.close()
-    for clip in clips:
-        clip.close()
-    
+
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
+    def decode(path):
+        # cv2.imread отдаёт готовый ndarray без PIL-объекта и без
+        # лишней копии в np.array; каналы разворачиваем в RGB
+        bgr = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+    # Декод PNG (libpng отпускает GIL) префетчится пулом потоков, пока
+    # главный поток гонит эффекты по текущему кадру; окно ограничено,
+    # чтобы не держать все кадры в памяти
+    prefetch = max(2, os.cpu_count() or 4)
+    with ThreadPoolExecutor(max_workers=prefetch) as ex:
+        pending = deque(ex.submit(decode, p) for p in image_files[:prefetch])
+        rest = iter(image_files[prefetch:])
+        i = 0
+        while pending:
+            frame = pending.popleft().result()
+            nxt = next(rest, None)
+            if nxt is not None:
+                pending.append(ex.submit(decode, nxt))
+            if frame.shape[:2] != (h, w):
+                frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+            t = i / fps  # Время для эффектов
+            processed_frame = process_frame(frame, t)
+            encoder.stdin.write(np.ascontiguousarray(processed_frame).tobytes())
+            i += 1
+
+    encoder.stdin.close()
+    encoder.wait()
+
     print("✅ Готово!")
 
 
@@ -377,6 +754,8 @@ if __name__ == "__main__":
                        help="Не создавать GIF")
     parser.add_argument("--no-audio", action="store_true",
                        help="Не добавлять аудио")
+    parser.add_argument("--gpu", action="store_true",
+                       help="Считать эффекты на GPU (нужен OpenCV с CUDA)")
     parser.add_argument("--from-screenshots", action="store_true",
                        help="Обработать из скриншотов в processed/")
     parser.add_argument("--screenshots-dir", default="processed",
@@ -394,6 +773,7 @@ if __name__ == "__main__":
             args.input,
             args.output,
             None if args.no_gif else args.gif,
-            add_audio=not args.no_audio
+            add_audio=not args.no_audio,
+            use_gpu=args.gpu
         )
 
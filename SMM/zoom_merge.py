@@ -3,144 +3,295 @@
 Простой скрипт для объединения двух видео с эффектом zoom in/out
 """
 
+import functools
+import os
+import subprocess
 import sys
 import numpy as np
 import cv2
 from moviepy.editor import VideoFileClip, CompositeVideoClip, concatenate_videoclips, ColorClip
 from moviepy.video.fx.all import fadein, fadeout
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba опционален — остаётся векторизованный NumPy-путь
+    njit = None
+
+def _zoom_matrices(duration, w, h, fps, zoom_in, zoom_out):
+    """Таблица warp-матриц «масштаб вокруг центра» по номеру кадра.
+
+    Масштаб — чистая функция времени, поэтому вся ease-in-out арифметика
+    считается один раз векторизованно.
+    Первая половина: zoom in (1.0 → zoom_in),
+    вторая: zoom out (zoom_in → zoom_out)."""
+    n = int(duration * fps) + 1
+    ts = np.arange(n) / fps
+    half = duration / 2
+    progress = np.where(ts < half, ts / half, (ts - half) / half)
+    progress = progress * progress * (3 - 2 * progress)
+    scales = np.where(ts < half,
+                      1.0 + (zoom_in - 1.0) * progress,
+                      zoom_in - (zoom_in - zoom_out) * progress)
+    return [np.array([[s, 0, (1 - s) * w / 2],
+                      [0, s, (1 - s) * h / 2]], dtype=np.float32)
+            for s in scales]
+
 def zoom_effect(clip, zoom_in=1.3, zoom_out=1.0):
     """Применяет плавный zoom in → zoom out"""
     duration = clip.duration
     w, h = clip.size
-    
+    fps = clip.fps or 24
+    out_buf = np.empty((h, w, 3), dtype=np.uint8)
+    Ms = _zoom_matrices(duration, w, h, fps, zoom_in, zoom_out)
+    n = len(Ms)
+
     def transform_frame(get_frame, t):
-        # Первая половина: zoom in (1.0 → zoom_in)
-        # Вторая половина: zoom out (zoom_in → zoom_out)
-        if t < duration / 2:
-            progress = t / (duration / 2)
-            # Плавная кривая ease-in-out
-            progress = progress * progress * (3 - 2 * progress)
-            scale = 1.0 + (zoom_in - 1.0) * progress
-        else:
-            progress = (t - duration / 2) / (duration / 2)
-            progress = progress * progress * (3 - 2 * progress)
-            scale = zoom_in - (zoom_in - zoom_out) * progress
-        
-        # Получаем кадр
         frame = get_frame(t)
-        
-        # Масштабируем через cv2
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-        zoomed = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-        
-        # Обрезаем/добавляем границы до исходного размера (центрируем)
-        if scale > 1.0:
-            y1 = (zoomed.shape[0] - h) // 2
-            x1 = (zoomed.shape[1] - w) // 2
-            zoomed = zoomed[y1:y1+h, x1:x1+w]
-        else:
-            # Если уменьшаем, добавляем черные границы
-            pad_y = (h - zoomed.shape[0]) // 2
-            pad_x = (w - zoomed.shape[1]) // 2
-            zoomed = cv2.copyMakeBorder(zoomed, pad_y, h-zoomed.shape[0]-pad_y,
-                                       pad_x, w-zoomed.shape[1]-pad_x,
-                                       cv2.BORDER_CONSTANT, value=[0,0,0])
-        
-        return zoomed
-    
+
+        # Одна аффинная трансформация сразу в буфер целевого размера —
+        # без промежуточного resize-массива и кропа/паддинга; чёрные
+        # поля при scale < 1 даёт BORDER_CONSTANT
+        M = Ms[min(int(t * fps), n - 1)]
+        cv2.warpAffine(frame, M, (w, h), dst=out_buf,
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+        return out_buf
+
     return clip.fl(transform_frame)
 
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def _eye_mask_kernel(out, gap, rx):
+        """Вся арифметика маски одним проходом по строкам, без HxW-временных"""
+        h, w = out.shape
+        cy0 = h // 2
+        cx0 = w // 2
+        for y in prange(h):
+            dy = abs(y - cy0)
+            for x in range(w):
+                dx = (x - cx0) / rx
+                e = 1.0 - dx * dx
+                if e < 0.0:
+                    e = 0.0
+                eg = gap * (0.3 + 0.7 * np.sqrt(e))
+                over = dy - eg
+                if over < 0.0:
+                    over = 0.0
+                v = 1.0 - over / (eg * 0.5 + 1.0)
+                if v < 0.0:
+                    v = 0.0
+                elif v > 1.0:
+                    v = 1.0
+                out[y, x] = v * v * (3.0 - 2.0 * v)
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def _apply_mask_kernel(frame, mask, out):
+        """Умножение кадра на маску uint8 → uint8 одним проходом.
+
+        Маска в [0, 1], так что результат не выходит за диапазон
+        и отдельный clip-проход не нужен."""
+        h, w = mask.shape
+        for y in prange(h):
+            for x in range(w):
+                m = mask[y, x]
+                out[y, x, 0] = np.uint8(frame[y, x, 0] * m)
+                out[y, x, 1] = np.uint8(frame[y, x, 1] * m)
+                out[y, x, 2] = np.uint8(frame[y, x, 2] * m)
+
+    # Прогрев: компиляция при импорте, а не на первом кадре моргания
+    _eye_mask_kernel(np.empty((2, 2), dtype=np.float32), 1.0, 1.0)
+    _apply_mask_kernel(np.zeros((2, 2, 3), dtype=np.uint8),
+                       np.zeros((2, 2), dtype=np.float32),
+                       np.empty((2, 2, 3), dtype=np.uint8))
+
+
+_MASK_BUFS = {}
+
+
+def _mask_buffer(h, w):
+    """Переиспользуемый float32-буфер маски под размер кадра"""
+    buf = _MASK_BUFS.get((h, w))
+    if buf is None:
+        buf = np.empty((h, w), dtype=np.float32)
+        _MASK_BUFS[(h, w)] = buf
+    return buf
+
+
+_FRAME_BUFS = {}
+
+
+def _frame_buffer(h, w):
+    """Переиспользуемый uint8-буфер кадра под размер кадра"""
+    buf = _FRAME_BUFS.get((h, w))
+    if buf is None:
+        buf = np.empty((h, w, 3), dtype=np.uint8)
+        _FRAME_BUFS[(h, w)] = buf
+    return buf
+
+
+def apply_eye_mask(frame, mask):
+    """Накладывает маску век на кадр.
+
+    С numba кадр читается и пишется как uint8 одним проходом; иначе —
+    прежний путь с float32-копией всего кадра."""
+    if njit is not None:
+        out = _frame_buffer(*frame.shape[:2])
+        _apply_mask_kernel(frame, mask, out)
+        return out
+
+    # Один броадкаст по всем каналам вместо трёх отдельных проходов,
+    # умножение и clip — по месту, без новых временных
+    frame = frame.astype(np.float32)
+    np.multiply(frame, mask[:, :, None], out=frame)
+    np.clip(frame, 0, 255, out=frame)
+    return frame.astype(np.uint8)
+
+
+@functools.lru_cache(maxsize=8)
+def _eye_mask_axes(h, w):
+    """1-D заготовки маски: вертикальные расстояния и эллиптический фактор.
+
+    Зависят только от размера кадра, поэтому считаются один раз."""
+    dist_y = np.abs(np.arange(h, dtype=np.float32) - h // 2)
+    dx = (np.arange(w, dtype=np.float32) - w // 2) / (w * 0.5)
+    ellipse_factor = np.sqrt(np.clip(1 - dx * dx, 0, 1))
+    return dist_y, ellipse_factor
+
+
 def create_eye_mask(h, w, progress, closing=True):
     """Создает маску в форме закрывающегося/открывающегося глаза"""
-    center_y, center_x = h // 2, w // 2
-    y_coords, x_coords = np.ogrid[:h, :w]
-    
     # Форма глаза: эллиптическая, закрывается сверху и снизу
     # Горизонтальный радиус (ширина глаза)
     rx = w * 0.5
-    
+
     # Вертикальная щель между веками (уменьшается при закрытии)
     # При progress=0 глаз открыт, при progress=1 полностью закрыт
-    if closing:
-        max_gap = h * 0.6  # Максимальная щель (открытый глаз)
-        gap = max_gap * (1 - progress)  # Щель уменьшается
-    else:
-        max_gap = h * 0.6
-        gap = max_gap * (1 - progress)  # Щель увеличивается при открытии
-    
-    # Расстояние от центра по вертикали
-    dist_y = np.abs(y_coords - center_y)
-    
-    # Форма век: эллиптическая кривая (веки более закрыты по краям)
-    # Расстояние от центра по горизонтали
-    dist_x = np.abs(x_coords - center_x)
-    # Эллиптическая форма: в центре больше щель, по краям меньше
-    ellipse_factor = np.sqrt(1 - np.clip((dist_x / rx) ** 2, 0, 1))
-    # Применяем эллиптическую форму к щели
+    max_gap = h * 0.6  # Максимальная щель (открытый глаз)
+    gap = max_gap * (1 - progress)
+
+    if njit is not None:
+        # NumPy-версия делает ~8 полных проходов по HxW с временными
+        # массивами; слитый numba-кернел пишет сразу в готовый буфер
+        out = _mask_buffer(h, w)
+        _eye_mask_kernel(out, gap, rx)
+        return out
+
+    dist_y, ellipse_factor = _eye_mask_axes(h, w)
+
+    # Применяем эллиптическую форму к щели (1-D по ширине)
     effective_gap = gap * (0.3 + 0.7 * ellipse_factor)  # 30-100% от gap
-    
-    # Видимость: чем ближе к центру по Y и чем больше effective_gap, тем больше видимость
-    visibility = np.clip(1 - np.maximum(0, dist_y - effective_gap) / (effective_gap * 0.5 + 1), 0, 1)
-    
+
+    # Видимость: чем ближе к центру по Y и чем больше effective_gap, тем
+    # больше видимость; единственный HxW-броадкаст из 1-D заготовок
+    visibility = np.clip(
+        1 - np.maximum(0, dist_y[:, None] - effective_gap[None, :])
+        / (effective_gap[None, :] * 0.5 + 1),
+        0, 1)
+
     # Плавный переход (smoothstep для мягких краев)
-    visibility = visibility ** 2 * (3 - 2 * visibility)
-    
-    return visibility
+    visibility = visibility * visibility * (3 - 2 * visibility)
+
+    # Маске хватает ~1/256 точности до uint8-квантования — половинной
+    # точности более чем достаточно, а байт по памяти ездит вдвое меньше
+    return visibility.astype(np.float16)
+
+def _blink_mask_table(h, w, blink_duration, fps, closing):
+    """Стек масок моргания по номеру кадра внутри окна блинка.
+
+    Маска зависит только от (h, w, progress), а прогресс дискретен по
+    кадрам — вся генерация выносится из per-frame пути в таблицу.
+    Закрытие идёт с ease-in (progress = raw²), открытие — с ease-out
+    (progress = (1-raw)²). Без numba таблица хранится в float16."""
+    n = int(blink_duration * fps) + 1
+    raw = np.linspace(0, 1, n)
+    progresses = raw * raw if closing else (1 - raw) * (1 - raw)
+    dtype = np.float32 if njit is not None else np.float16
+    return [np.array(create_eye_mask(h, w, float(p), closing), dtype=dtype)
+            for p in progresses]
 
 def blink_close_effect(clip, blink_duration=0.15):
     """Моргание: закрытие глаза в конце клипа с формой век"""
+    duration = clip.duration
+    w, h = clip.size
+    fps = clip.fps or 24
+    masks = _blink_mask_table(h, w, blink_duration, fps, closing=True)
+
     def make_frame(get_frame, t):
         frame = get_frame(t)
-        duration = clip.duration
-        h, w = frame.shape[:2]
-        
         if t > duration - blink_duration:
-            blink_progress = (t - (duration - blink_duration)) / blink_duration
-            # Плавное закрытие (ease-in)
-            blink_progress = blink_progress * blink_progress
-            
-            # Создаем маску в форме глаза
-            mask = create_eye_mask(h, w, blink_progress, closing=True)
-            
-            # Применяем маску к каждому каналу
-            frame = frame.astype(np.float32)
-            for c in range(3):
-                frame[:, :, c] = frame[:, :, c] * mask
-            frame = np.clip(frame, 0, 255).astype(np.uint8)
-        
+            idx = min(int((t - (duration - blink_duration)) * fps), len(masks) - 1)
+            frame = apply_eye_mask(frame, masks[idx])
         return frame
-    
+
     return clip.fl(make_frame)
 
 def blink_open_effect(clip, blink_duration=0.15):
     """Моргание: открытие глаза в начале клипа с формой век"""
+    w, h = clip.size
+    fps = clip.fps or 24
+    masks = _blink_mask_table(h, w, blink_duration, fps, closing=False)
+
     def make_frame(get_frame, t):
         frame = get_frame(t)
-        h, w = frame.shape[:2]
-        
         if t < blink_duration:
-            blink_progress = t / blink_duration
-            # Плавное открытие (ease-out)
-            blink_progress = 1 - (1 - blink_progress) * (1 - blink_progress)
-            
-            # Инвертируем для открытия (начинаем с закрытого)
-            progress = 1 - blink_progress
-            
-            # Создаем маску в форме глаза
-            mask = create_eye_mask(h, w, progress, closing=False)
-            
-            # Применяем маску к каждому каналу
-            frame = frame.astype(np.float32)
-            for c in range(3):
-                frame[:, :, c] = frame[:, :, c] * mask
-            frame = np.clip(frame, 0, 255).astype(np.uint8)
-        
+            idx = min(int(t * fps), len(masks) - 1)
+            frame = apply_eye_mask(frame, masks[idx])
         return frame
-    
+
     return clip.fl(make_frame)
 
+def neuro_clip_effect(clip, zoom_in=1.3, zoom_out=1.0,
+                      blink_open_duration=0.0, blink_close_duration=0.0):
+    """Zoom и моргания одним fl-колбэком на клип.
+
+    Каждый обёрнутый эффект — это отдельный слой Python-колбэков на
+    каждый кадр; здесь warp и маски век применяются за один проход."""
+    duration = clip.duration
+    w, h = clip.size
+    fps = clip.fps or 24
+    out_buf = np.empty((h, w, 3), dtype=np.uint8)
+    Ms = _zoom_matrices(duration, w, h, fps, zoom_in, zoom_out)
+    n = len(Ms)
+    open_masks = (_blink_mask_table(h, w, blink_open_duration, fps, closing=False)
+                  if blink_open_duration else None)
+    close_masks = (_blink_mask_table(h, w, blink_close_duration, fps, closing=True)
+                   if blink_close_duration else None)
+
+    def transform_frame(get_frame, t):
+        frame = get_frame(t)
+
+        M = Ms[min(int(t * fps), n - 1)]
+        cv2.warpAffine(frame, M, (w, h), dst=out_buf,
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+        frame = out_buf
+
+        if open_masks is not None and t < blink_open_duration:
+            idx = min(int(t * fps), len(open_masks) - 1)
+            frame = apply_eye_mask(frame, open_masks[idx])
+        elif close_masks is not None and t > duration - blink_close_duration:
+            idx = min(int((t - (duration - blink_close_duration)) * fps),
+                      len(close_masks) - 1)
+            frame = apply_eye_mask(frame, close_masks[idx])
+        return frame
+
+    return clip.fl(transform_frame)
+
+_NVENC_AVAILABLE = None
+
+def _has_nvenc():
+    """Проверяет наличие h264_nvenc в сборке ffmpeg (кэшируется)"""
+    global _NVENC_AVAILABLE
+    if _NVENC_AVAILABLE is None:
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-encoders'],
+                capture_output=True, text=True
+            )
+            _NVENC_AVAILABLE = result.returncode == 0 and 'h264_nvenc' in result.stdout
+        except FileNotFoundError:
+            _NVENC_AVAILABLE = False
+    return _NVENC_AVAILABLE
+
 def main():
     video1 = "Промт_для_презентации_Neuro.mp4"
     video2 = "ezgif-68cfdb24be61ad.mp4"
@@ -152,36 +303,64 @@ def main():
     print(f"🎬 Загрузка: {video2}")
     clip2 = VideoFileClip(video2)
     
-    print("🔍 Применение zoom эффектов...")
-    # Применяем zoom к каждому клипу
-    zoomed1 = zoom_effect(clip1, zoom_in=1.3, zoom_out=1.0)
-    zoomed2 = zoom_effect(clip2, zoom_in=1.3, zoom_out=1.0)
-    
-    # Эффект моргания вместо обычного fade
-    print("👁️ Добавление эффекта моргания...")
-    zoomed1 = blink_open_effect(zoomed1, blink_duration=0.2)   # Открытие в начале
-    zoomed1 = blink_close_effect(zoomed1, blink_duration=0.2)  # Закрытие в конце
-    zoomed2 = blink_open_effect(zoomed2, blink_duration=0.2)   # Открытие в начале
+    # Zoom и моргание (вместо обычного fade) одним колбэком на клип
+    print("🔍 Применение zoom и эффекта моргания...")
+    zoomed1 = neuro_clip_effect(clip1, zoom_in=1.3, zoom_out=1.0,
+                                blink_open_duration=0.2, blink_close_duration=0.2)
+    zoomed2 = neuro_clip_effect(clip2, zoom_in=1.3, zoom_out=1.0,
+                                blink_open_duration=0.2)
     
-    print("🔗 Объединение...")
-    final = concatenate_videoclips([zoomed1, zoomed2], method="compose")
-    
-    print(f"💾 Сохранение: {output}")
-    final.write_videofile(
-        output,
-        fps=24,
-        codec='libx264',
-        preset='medium',
-        bitrate='5000k'
+    # Склейка стыкует клипы без наложения, поэтому финальный файл можно
+    # собрать concat-демуксером с -c copy: каждый клип кодируется один раз
+    # с одинаковыми параметрами и фиксированным GOP, а целый проход энкода
+    # на итоговом видео исчезает. Для copy-склейки размеры должны совпадать
+    if zoomed1.size != zoomed2.size:
+        from moviepy.video.fx.all import resize
+        zoomed2 = zoomed2.fx(resize, newsize=zoomed1.size)
+
+    # NVENC на порядок быстрее программного энкода; без него CRF вместо
+    # фиксированного битрейта — качество то же, байты только там, где нужны
+    if _has_nvenc():
+        codec, preset, params = 'h264_nvenc', 'p5', ['-rc', 'vbr', '-cq', '20',
+                                                     '-b:v', '5000k', '-g', '48']
+    else:
+        codec, preset, params = 'libx264', 'medium', ['-crf', '20', '-g', '48']
+
+    temp_parts = []
+    for idx, zoomed in enumerate((zoomed1, zoomed2), 1):
+        part = f"_zoom_part{idx}.mp4"
+        print(f"💾 Кодирование части {idx}/2: {part}")
+        zoomed.write_videofile(
+            part,
+            fps=24,
+            codec=codec,
+            preset=preset,
+            ffmpeg_params=params,
+            # Половина ядер энкодеру, остальное — Python-конвейеру эффектов
+            threads=max(2, (os.cpu_count() or 4) // 2)
+        )
+        temp_parts.append(part)
+
+    print(f"🔗 Склейка без перекодирования: {output}")
+    list_path = "_zoom_concat.txt"
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for part in temp_parts:
+            f.write(f"file '{part}'\n")
+    subprocess.run(
+        ['ffmpeg', '-y', '-f', 'concat', '-safe', '0',
+         '-i', list_path, '-c', 'copy', output],
+        capture_output=True, check=True
     )
-    
+
     # Очистка
-    final.close()
+    for part in temp_parts:
+        os.remove(part)
+    os.remove(list_path)
     zoomed1.close()
     zoomed2.close()
     clip1.close()
     clip2.close()
-    
+
     print("✅ Готово!")
 
 if __name__ == "__main__":